@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark for the startup cost of importing flowtools modules.
+
+Every module is imported in a fresh interpreter a number of times, the
+best wall clock time is reported together with whether any of the heavy
+plotting or data frame packages were loaded as a side effect.
+
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+HEAVY = ['matplotlib', 'pandas', 'scipy']
+
+def time_import(module, repeat):
+    """
+    Return the best time of importing module in a new interpreter and
+    a list of heavy packages that were loaded by the import.
+
+    """
+
+    code = ("import sys, %s; print(' '.join(m for m in %r if m in sys.modules))"
+            % (module, HEAVY))
+
+    best = float('inf')
+    loaded = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = subprocess.check_output([sys.executable, '-c', code])
+        best = min(best, time.perf_counter() - start)
+        loaded = out.decode().split()
+
+    return best, loaded
+
+parser = argparse.ArgumentParser(
+        description="Measure the startup time of importing flowtools modules.")
+parser.add_argument('modules', nargs='*', default=[
+        'numpy', 'flowtools.datamaps', 'flowtools.utils', 'flowtools.draw',
+        'flowtools.profiles', 'flowtools.shear', 'flowtools.dissipation',
+        'flowtools.ensemble', 'flowtools.cache', 'flowtools.velocity',
+        'flowtools.bootstrap', 'flowtools.significance',
+        'flowtools.frames', 'flowtools.derived', 'flowtools.pipeline'],
+        help="modules to import (default: all flowtools modules)")
+parser.add_argument('-n', '--repeat', type=int, default=5,
+        help="number of imports per module, best is reported (default: 5)")
+args = parser.parse_args()
+
+# Baseline of starting the interpreter
+baseline, _ = time_import('sys', args.repeat)
+print("%-24s %9s %9s  %s" % ('module', 'time (ms)', 'added', 'heavy modules'))
+print("%-24s %9.1f %9s" % ('(interpreter)', 1e3*baseline, '-'))
+
+for module in args.modules:
+    best, loaded = time_import(module, args.repeat)
+    print("%-24s %9.1f %9.1f  %s"
+            % (module, 1e3*best, 1e3*(best - baseline), ' '.join(loaded) or '-'))
@@ -0,0 +1,165 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Bootstrap confidence intervals of ensemble means.
+
+Resamples of runs are drawn once as a matrix of how many times every run
+is included in every resample. The means of all resamples at a set of
+times are then a single matrix product with the aligned series of runs,
+which is done for blocks of times to keep memory bounded.
+
+Functions:
+    bootstrap_ci - percentile confidence intervals of the mean of runs
+    resample_counts - draw the run counts of bootstrap resamples
+
+"""
+
+import multiprocessing
+import numpy as np
+import warnings
+
+def bootstrap_ci(values, num_resamples=10000, confidence=0.95, seed=None,
+        processes=1, max_elements=2**24):
+    """
+    Calculate percentile bootstrap confidence intervals of the mean over
+    runs of aligned series (a 2d array with runs along the first index,
+    as from ensemble.align), at every time. NaN values are left out.
+
+    Values can also be a dictionary of such arrays, as for several fields
+    from ensemble.align, in which case all are resampled with the same
+    resamples and a dictionary of results is returned.
+
+    Returns a dictionary with arrays of the mean as 'val' and the lower
+    and upper limits of the interval as 'lower' and 'upper'.
+
+    Keywords:
+        num_resamples - number of bootstrap resamples (default: 10000)
+        confidence - confidence level of the interval (default: 0.95)
+        seed - seed for the random generator, for reproducible intervals
+        processes - number of processes to calculate blocks of times in
+            (default: 1)
+        max_elements - maximum number of resample means held at a time
+            by every process, which bounds memory use
+
+    """
+
+    if isinstance(values, dict):
+        fields = list(values.keys())
+        arrays = [np.atleast_2d(np.asarray(values[field], dtype=float))
+                for field in fields]
+        sizes = [array.shape[1] for array in arrays]
+
+        # Resample all fields at once as a single set of times
+        joined = bootstrap_ci(np.concatenate(arrays, axis=1), num_resamples,
+                confidence, seed, processes, max_elements)
+
+        split = np.cumsum(sizes)[:-1]
+        results = {field: {} for field in fields}
+        for key, result in joined.items():
+            for field, part in zip(fields, np.split(result, split)):
+                results[field][key] = part
+
+        return results
+
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    num_runs, num_times = values.shape
+
+    counts = resample_counts(num_runs, num_resamples, seed)
+    alpha = (1. - confidence)/2
+    quantiles = [alpha, 1. - alpha]
+
+    block = max(1, max_elements//max(1, num_resamples))
+    blocks = [values[:, i:i+block] for i in range(0, num_times, block)]
+
+    if processes == 1:
+        _init_worker(counts, quantiles)
+        limits = list(map(_resample_block, blocks))
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker,
+                initargs=(counts, quantiles)) as pool:
+            limits = list(pool.imap(_resample_block, blocks))
+
+    if limits:
+        limits = np.concatenate(limits, axis=1)
+    else:
+        limits = np.empty((2, 0))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        present = ~np.isnan(values)
+        mean = np.where(present, values, 0.).sum(axis=0)/present.sum(axis=0)
+
+    return {'val': mean, 'lower': limits[0], 'upper': limits[1]}
+
+def resample_counts(num_runs, num_resamples, seed=None, chunksize=1000):
+    """
+    Draw num_resamples bootstrap resamples of num_runs runs with a random
+    generator seeded with seed. Returns a 2d array of how many times every
+    run (column) is drawn in every resample (row).
+
+    Resamples are drawn in chunks of chunksize as matrices of run indices,
+    which are converted to counts.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    counts = np.empty((num_resamples, num_runs))
+
+    for start in range(0, num_resamples, chunksize):
+        num = min(chunksize, num_resamples - start)
+        index = rng.integers(0, num_runs, size=(num, num_runs))
+
+        # Offset indices of every resample to count all with one bincount
+        index += num_runs*np.arange(num)[:, np.newaxis]
+        counts[start:start+num] = np.bincount(index.ravel(),
+                minlength=num*num_runs).reshape(num, num_runs)
+
+    return counts
+
+_counts = None
+_quantiles = None
+
+def _init_worker(counts, quantiles):
+    """Set the resample counts and quantiles used by this process."""
+
+    global _counts, _quantiles
+
+    _counts = counts
+    _quantiles = quantiles
+
+    return None
+
+def _resample_block(values):
+    """
+    Return the quantiles of resample means of a block of aligned values,
+    with the lower limits in the first and upper limits in the second row.
+
+    """
+
+    present = ~np.isnan(values)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (_counts @ np.where(present, values, 0.))/(_counts @ present)
+
+    if not np.isnan(means).any():
+        return np.quantile(means, _quantiles, axis=0)
+
+    # Times without values in any resample give NaN limits without warning
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        limits = np.nanquantile(means, _quantiles, axis=0)
+
+    return limits
@@ -0,0 +1,345 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Caches of data which is read or calculated from files.
+
+Classes:
+    DiskCache - a least recently used cache of arrays in files
+    LRUCache - a least recently used cache with a memory budget
+
+Functions:
+    file_key - get a key identifying the current contents of a file
+
+"""
+
+import collections
+import hashlib
+import numpy as np
+import os
+import threading
+
+def file_key(_path):
+    """
+    Return a key of (path, mtime, size) for the file at _path, which
+    changes when the file is modified.
+
+    """
+
+    stat = os.stat(_path)
+
+    return os.path.abspath(_path), stat.st_mtime_ns, stat.st_size
+
+class DiskCache(object):
+    """
+    A cache of arrays stored as .npy files in a directory, which persists
+    between processes. Arrays are read back memory mapped, so only the
+    parts which are used are read from disk. The least recently used
+    files are removed when the size budget is exceeded.
+
+    The files and their sizes are found by a single scan of the directory
+    at first use and then tracked as arrays are stored and evicted, so
+    storing an array does not read the directory. Files stored by other
+    processes after the scan are not counted against the budget of this
+    one, but their own caches evict them.
+
+    The cache is disabled if directory is None, in which case nothing is
+    stored and get always returns the default.
+
+    Keywords:
+        directory - directory of the cache files, created if needed
+        max_bytes - size budget of all files in bytes (default: 4 GiB)
+
+    Properties:
+        enabled - whether a directory is set
+        nbytes - the number of bytes of all tracked files in the cache
+
+    Methods:
+        clear - remove all files and reset counters
+        get - get an array, or a default if not cached
+        put - store an array
+
+    Attributes 'hits' and 'misses' count the outcome of calls to get.
+    The cache can be used from several threads.
+
+    """
+
+    def __init__(self, directory=None, max_bytes=4*2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.RLock()
+        self._index = None
+        self._nbytes = 0
+
+        return None
+
+    @property
+    def enabled(self):
+        return self.directory != None
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            self._scan()
+            return self._nbytes
+
+    def clear(self):
+        """Remove all files of the cache and reset counters."""
+
+        with self._lock:
+            for _path, _ in self._entries():
+                _remove(_path)
+
+            self._index = None
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+        return None
+
+    def get(self, key, default=None):
+        """
+        Return the array stored for key as a read-only memory map, or
+        default if it is not cached.
+
+        """
+
+        if not self.enabled:
+            return default
+
+        _path = self._path(key)
+        try:
+            array = np.load(_path, mmap_mode='r')
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return default
+
+        # The modification time of files orders them by last use between
+        # processes, the index within this one
+        try:
+            os.utime(_path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self._scan()
+            if _path in self._index:
+                self._index.move_to_end(_path)
+            else:
+                try:
+                    self._track(_path, os.stat(_path).st_size)
+                except OSError:
+                    pass
+            self.hits += 1
+
+        return array
+
+    def put(self, key, array):
+        """
+        Store array under key, removing the least recently used files
+        until within the size budget. Arrays larger than the budget are
+        not stored and failures to write are ignored.
+
+        """
+
+        if not self.enabled or array.nbytes > self.max_bytes:
+            return None
+
+        _path = self._path(key)
+        temporary = '%s.%d.%d.tmp' % (_path, os.getpid(),
+                threading.get_ident())
+
+        # Write to a temporary file and rename, so that other processes
+        # never read a partial file
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temporary, 'wb') as _file:
+                np.save(_file, array)
+            os.replace(temporary, _path)
+            size = os.stat(_path).st_size
+        except OSError:
+            _remove(temporary)
+            return None
+
+        with self._lock:
+            self._scan()
+            self._track(_path, size)
+            self._evict()
+
+        return None
+
+    def _entries(self):
+        """Return a list of (path, stat) of all files of the cache."""
+
+        entries = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.endswith('.npy'):
+                        try:
+                            entries.append((entry.path, entry.stat()))
+                        except OSError:
+                            pass
+        except (OSError, TypeError):
+            pass
+
+        return entries
+
+    def _evict(self):
+        """Remove the least recently used files until within budget."""
+
+        while self._nbytes > self.max_bytes and self._index:
+            _path, size = self._index.popitem(last=False)
+            self._nbytes -= size
+            _remove(_path)
+
+        return None
+
+    def _path(self, key):
+        """Return the file name of key in the cache directory."""
+
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+
+        return os.path.join(self.directory, name + '.npy')
+
+    def _scan(self):
+        """
+        Build the index of files by last use and their total size from a
+        scan of the directory, if not already done.
+
+        """
+
+        if self._index != None:
+            return None
+
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+
+        self._index = collections.OrderedDict(
+                (_path, stat.st_size) for _path, stat in entries)
+        self._nbytes = sum(self._index.values())
+
+        return None
+
+    def _track(self, _path, size):
+        """Add or update a file of size bytes as the most recently used."""
+
+        self._nbytes -= self._index.pop(_path, 0)
+        self._index[_path] = size
+        self._nbytes += size
+
+        return None
+
+class LRUCache(object):
+    """
+    A cache of values with a memory budget, from which the least recently
+    used values are evicted when the budget is exceeded. Values larger
+    than the budget are not stored.
+
+    Keywords:
+        max_bytes - memory budget in bytes (default: 256 MiB)
+
+    Properties:
+        nbytes - the number of bytes currently held
+
+    Methods:
+        clear - remove all values and reset counters
+        get - get a value, or a default if not cached
+        put - store a value with its size in bytes
+
+    Attributes 'hits' and 'misses' count the outcome of calls to get.
+    The cache can be used from several threads.
+
+    """
+
+    def __init__(self, max_bytes=256*2**20):
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self.clear()
+
+        return None
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def clear(self):
+        """Remove all values and reset counters."""
+
+        with self._lock:
+            self._values = collections.OrderedDict()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+        return None
+
+    def get(self, key, default=None):
+        """Return the value of key, or default if it is not cached."""
+
+        with self._lock:
+            try:
+                value, _ = self._values[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._values.move_to_end(key)
+            self.hits += 1
+
+        return value
+
+    def put(self, key, value, nbytes):
+        """
+        Store value with a size of nbytes under key, evicting the least
+        recently used values until within the memory budget.
+
+        """
+
+        with self._lock:
+            if key in self._values:
+                self._nbytes -= self._values.pop(key)[1]
+
+            if nbytes > self.max_bytes:
+                return None
+
+            self._values[key] = (value, nbytes)
+            self._nbytes += nbytes
+
+            while self._nbytes > self.max_bytes:
+                _, (_, size) = self._values.popitem(last=False)
+                self._nbytes -= size
+
+        return None
+
+def _remove(_path):
+    """Remove a file, ignoring if it does not exist."""
+
+    try:
+        os.remove(_path)
+    except OSError:
+        pass
+
+    return None
@@ -17,25 +17,356 @@
 """
 Classes and tools for data maps.
 
+Drawing methods import matplotlib when called, the module itself does
+not depend on it.
+
 Classes:
     DataMap - a single data map
     Spread - the spreading of a System object
     System - a set of DataMap objects
 
 Functions:
+    combine_arrays - combine cells of field arrays into larger ones
     create_filenames - creates file names for System.
+    downsample - combine cells of field arrays to a maximum number of cells
+    droplet_mask - get the 'droplet' cells of a mass array
+    is_binary - check if a data map file is in binary format
+    pyramid_filename - get the file name of a coarse grained level of a map
+    read_arrays - read the fields of a data map file into 2d arrays
+    read_table - read the fields and cell values of a data map file
+    save_arrays - save field arrays to a binary data map file
+    save_pyramid - save coarse grained levels of a data map
 
 """
 
+from flowtools.cache import DiskCache, LRUCache, file_key
 from flowtools.draw import draw, plot_line
+from flowtools.frames import find_gaps, index_frames
 
+import collections
+import concurrent.futures
+import copy
 import itertools
 import math
 import numpy as np
 import os
-import pylab as plt
-import struct
 import sys
+import warnings
+
+# Parsed data map files by (path, mtime, size), disabled unless a directory
+# is set here or by the environment variable FLOWTOOLS_CACHE_DIR
+frame_cache = DiskCache(os.environ.get('FLOWTOOLS_CACHE_DIR'),
+        int(os.environ.get('FLOWTOOLS_CACHE_MAX_BYTES', 4*2**30)))
+
+def is_binary(_path, checksize=512):
+    """
+    Returns True of data file is binary format, else False.
+
+    """
+
+    with open(_path, 'r') as _file:
+        try:
+            line = _file.read(checksize)
+            if '\n' in line:
+                return False
+            else:
+                raise UnicodeDecodeError
+
+        except UnicodeDecodeError:
+            return True
+
+def pyramid_filename(_path, level):
+    """
+    Return the file name of the coarse grained level of a data map at
+    _path, where level is the number of cells combined along each axis.
+    Level 1 is the map itself.
+
+    Example:
+        pyramid_filename('include/datamap00001.dat', 4) returns
+        'include/datamap00001.x4.dat'.
+
+    """
+
+    if level == 1:
+        return _path
+
+    root, ext = os.path.splitext(_path)
+    return '%s.x%d%s' % (root, level, ext)
+
+def read_arrays(_path, fields=None, level=1):
+    """
+    Read the fields of a data map at _path into a dictionary of 2d numpy
+    arrays, arranged as DataMap.cells with the first index giving the row
+    and the second the column of cells.
+
+    Fields are read straight from file without creating cell dictionaries
+    or checking for 'droplet' cells, which makes this much faster than
+    creating a DataMap when only the field values are needed.
+
+    Keywords:
+        fields - a list of fields to return, defaults to all in file
+        level - read this coarse grained level saved by save_pyramid
+
+    Example:
+        read_arrays('include/datamap.dat', ['M', 'U'])['U'][:, 10]
+        returns the flow along x of all rows in the eleventh column.
+
+    """
+
+    _path = pyramid_filename(_path, level)
+    header, data = read_table(_path)
+
+    if fields == None:
+        fields = header
+    if not set(fields).issubset(header):
+        raise KeyError("fields %s not all in data map '%s'" % (fields, _path))
+
+    return _table_arrays(header, data, fields)
+
+def _table_arrays(header, data, fields):
+    """
+    Return a dictionary of 2d arrays of fields from a table of a data map
+    as read by read_table, arranged as by read_arrays.
+
+    """
+
+    # Cells are written column by column, find number of cells in y
+    x = data[:, header.index('X')]
+    num_y = np.argmax(x != x[0]) or len(x)
+    num_x = len(x) // num_y
+
+    arrays = {}
+    for field in fields:
+        column = data[:num_x*num_y, header.index(field)]
+        arrays[field] = column.reshape(num_x, num_y).transpose().astype(
+                np.float64)
+
+    return arrays
+
+def read_table(_path):
+    """
+    Read a data map file at _path as a list of the fields in the file
+    and a 2d array with a row of field values for every cell, in the
+    order of the file. Values of binary files are single precision.
+
+    If frame_cache is enabled the parsed table is stored in it after the
+    first read, later reads of the unmodified file (from any process)
+    return a read-only memory map of the stored table without parsing.
+
+    """
+
+    if frame_cache.enabled:
+        key = file_key(_path)
+        table = frame_cache.get(key)
+        if table is not None:
+            header = list(table.dtype.names)
+            data = np.asarray(table).view(table.dtype[0]).reshape(-1,
+                    len(header))
+            return header, data
+
+    if is_binary(_path):
+        # Order of fields must not change
+        header = ['X', 'Y', 'N', 'T', 'M', 'U', 'V']
+        data = np.fromfile(_path, dtype=np.float32).reshape(-1, len(header))
+    else:
+        with open(_path, 'r') as _file:
+            header = _file.readline().strip().upper().split()
+            data = np.loadtxt(_file, ndmin=2)
+
+    # Stored as a record for every cell, which keeps the field names
+    if frame_cache.enabled:
+        dtype = np.dtype([(field, data.dtype) for field in header])
+        frame_cache.put(key, np.ascontiguousarray(data).view(dtype).ravel())
+
+    return header, data
+
+def save_arrays(_path, arrays):
+    """
+    Save field arrays to a data map file at _path in the binary format,
+    which has to include all fields 'X', 'Y', 'N', 'T', 'M', 'U' and 'V'.
+
+    """
+
+    # Order of fields must not change
+    fields = ['X', 'Y', 'N', 'T', 'M', 'U', 'V']
+
+    # Cells are written column by column
+    data = np.array([arrays[field].transpose().ravel() for field in fields])
+    data.transpose().astype(np.float32).tofile(_path)
+
+    return None
+
+def save_pyramid(_path, levels=3):
+    """
+    Save coarse grained levels of the data map at _path, combining 2, 4, 8,
+    ... up to 2**levels cells along each axis. Cells are combined using the
+    rules of DataMap.combine and every level is saved in the binary format
+    next to the map, with file names from pyramid_filename.
+
+    Every level can be read as any data map, or by supplying the keyword
+    'level' to read_arrays or DataMap. Returns the list of saved file names.
+
+    """
+
+    arrays = read_arrays(_path, ['X', 'Y', 'N', 'T', 'M', 'U', 'V'])
+
+    saved = []
+    for i in range(1, levels + 1):
+        # Combining pairs of the previous level is identical to combining
+        # all cells of the full map
+        arrays = combine_arrays(arrays, 2, 2)
+        if min(arrays['X'].shape) < 1:
+            break
+
+        filename = pyramid_filename(_path, 2**i)
+        save_arrays(filename, arrays)
+        saved.append(filename)
+
+    return saved
+
+def droplet_mask(mass, min_mass=0., columns=1):
+    """
+    Return a boolean array of 'droplet' cells for a 2d array of cell
+    masses, as marked by DataMap.droplet with the same options.
+
+    DataMap.droplet updates cells in place row by row, so that cells below
+    and to the left of the considered are checked with their updated
+    status. This is reproduced by iterating the vectorised check until
+    the mask is unchanged, which gives the identical result since every
+    cell only depends on cells before it.
+
+    """
+
+    def connected(current, original, other_row):
+        """
+        Check for connections in other_row, scanning along the row to the
+        right and left as long as cells in the own row are droplet cells.
+
+        """
+
+        found = np.zeros(original.shape, dtype=bool)
+        num_cols = original.shape[1]
+
+        for direction, own in ((1, original), (-1, current)):
+            alive = original.copy()
+            for i in range(columns + 1):
+                shift = direction*i
+                if abs(shift) >= num_cols:
+                    break
+
+                if i > 0:
+                    alive &= shifted(own, shift)
+                found |= alive & shifted(other_row, shift)
+
+        return found
+
+    def shifted(array, shift):
+        """Array of values at column + shift, False outside of system."""
+
+        out = np.zeros(array.shape, dtype=bool)
+        if shift > 0:
+            out[:, :-shift] = array[:, shift:]
+        elif shift < 0:
+            out[:, -shift:] = array[:, :shift]
+        else:
+            out[:] = array
+
+        return out
+
+    mass = np.asarray(mass)
+    original = (mass != 0.) & (mass >= min_mass)
+
+    # Rows above are checked with original, rows below with updated status
+    above = np.zeros(original.shape, dtype=bool)
+    above[:-1] = original[1:]
+
+    current = original.copy()
+    while True:
+        below = np.zeros(original.shape, dtype=bool)
+        below[1:] = current[:-1]
+
+        updated = connected(current, original, above)
+        updated |= connected(current, original, below)
+
+        if np.array_equal(updated, current):
+            break
+        current = updated
+
+    return current
+
+def combine_arrays(arrays, nx=1, ny=1):
+    """
+    Combine cells of field arrays (as from read_arrays) into larger ones,
+    'nx' and 'ny' cells in x and y respectively, using the same rules as
+    DataMap.combine: positions are averaged, mass and number of atoms
+    summed, flow weighted by mass and temperature by number of atoms.
+    Cells of a combined cell are 'droplet' if any of them is. Other fields
+    are averaged.
+
+    If an even division cannot be found the remainder of cells is cut
+    from the right and top of the system.
+
+    """
+
+    def blocks(array):
+        """Reshape into (rows, ny, columns, nx) blocks of cells."""
+
+        rows = array.shape[0] // ny
+        columns = array.shape[1] // nx
+        return array[:rows*ny, :columns*nx].reshape(rows, ny, columns, nx)
+
+    def block_sum(array):
+        return blocks(array).sum(axis=(1, 3))
+
+    combined = {}
+    for field, array in arrays.items():
+        if field in ('U', 'V') and 'M' in arrays:
+            mass = block_sum(arrays['M'])
+            flow = block_sum(arrays['M']*array)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                combined[field] = np.where(mass > 0, flow/mass, flow)
+        elif field == 'T' and 'N' in arrays:
+            num = block_sum(arrays['N'])
+            temp = block_sum(arrays['N']*array)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                combined[field] = np.where(num > 0, temp/num, temp)
+        elif field in ('M', 'N'):
+            combined[field] = block_sum(array)
+        elif field == 'droplet':
+            combined[field] = blocks(array).any(axis=(1, 3))
+        else:
+            combined[field] = blocks(array).mean(axis=(1, 3))
+
+    return combined
+
+def downsample(arrays, max_cells):
+    """
+    Combine cells of field arrays using combine_arrays into a grid of at
+    most max_cells cells, with equally many cells combined along x and y.
+    Mass 'M' and number of atoms 'N' are returned as the mean per original
+    cell, so that values compare with those of the full resolution.
+
+    Returns the downsampled arrays and the number of cells combined
+    along each axis.
+
+    """
+
+    shape = next(iter(arrays.values())).shape
+    num = max(1, int(math.ceil(math.sqrt(shape[0]*shape[1]/max_cells))))
+
+    # Increase if rounding leaves the grid too large
+    while (shape[0] // num)*(shape[1] // num) > max_cells:
+        num += 1
+
+    if num == 1:
+        return arrays, 1
+
+    combined = combine_arrays(arrays, num, num)
+    for field in ('M', 'N'):
+        if field in combined:
+            combined[field] = combined[field]/num**2
+
+    return combined, num
 
 class Spread(object):
     """
@@ -48,12 +379,25 @@ class Spread(object):
         base - base filename
         delta_t - time difference between frames
         floor - floor of system
+        impact - center of mass (X, Y) of droplet at impact
+        last_frame - number of the last frame which was collected, as
+            named in its file if found from a base
         min_mass - minimum mass of system
 
+    Series are stored as float arrays in the dictionary 'spread', with
+    values of fields under 'val' and errors under 'std_error'. Frames
+    added while collecting are written into a buffer which grows by
+    doubling, the series being views of it.
+
     Properties:
-        impact - the impact frame of the system
+        left, right, com, dist - edge positions, center of mass and its
+            height above the floor
+        nbytes - memory held by the series
+        radius, diameter - derived from the edge positions
+        times - times of frames
 
     Methods:
+        copy - return a copy with copied series
         plot - draw the spreading
         read - read spreading information from a file
         save - save spreading information to a file
@@ -65,6 +409,8 @@ class Spread(object):
         self.base = kwargs.pop('base', None)
         self.delta_t = kwargs.pop('delta_t', None)
         self.floor = kwargs.pop('floor', None)
+        self.impact = kwargs.pop('impact', None)
+        self.last_frame = kwargs.pop('last_frame', None)
         self.min_mass = kwargs.pop('min_mass', None)
 
         self._reset()
@@ -76,7 +422,7 @@ class Spread(object):
         return self.spread['left']['val']
     @left.setter
     def left(self, _list):
-        self.spread['left']['val'] = _list
+        self.spread['left']['val'] = np.asarray(_list, dtype=float)
         return None
 
     @property
@@ -84,7 +430,7 @@ class Spread(object):
         return self.spread['right']['val']
     @right.setter
     def right(self, _list):
-        self.spread['right']['val'] = _list
+        self.spread['right']['val'] = np.asarray(_list, dtype=float)
         return None
 
     @property
@@ -92,7 +438,7 @@ class Spread(object):
         return self.spread['com']['val']
     @com.setter
     def com(self, _list):
-        self.spread['com']['val'] = _list
+        self.spread['com']['val'] = np.asarray(_list, dtype=float)
         return None
 
     @property
@@ -100,7 +446,7 @@ class Spread(object):
         return self.spread['diameter']['val']
     @diameter.setter
     def diameter(self, _list):
-        self.spread['diameter']['val'] = _list
+        self.spread['diameter']['val'] = np.asarray(_list, dtype=float)
         return None
 
     @property
@@ -108,15 +454,24 @@ class Spread(object):
         return self.spread['dist']['val']
     @dist.setter
     def dist(self, _list):
-        self.spread['dist']['val'] = _list
+        self.spread['dist']['val'] = np.asarray(_list, dtype=float)
         return None
 
+    @property
+    def nbytes(self):
+        nbytes = np.asarray(self.times).nbytes
+        for field in ('left', 'right', 'com', 'dist', 'radius', 'diameter'):
+            for series in self.spread[field].values():
+                nbytes += np.asarray(series).nbytes
+
+        return nbytes
+
     @property
     def radius(self):
         return self.spread['radius']['val']
     @radius.setter
     def radius(self, _list):
-        self.spread['radius']['val'] = _list
+        self.spread['radius']['val'] = np.asarray(_list, dtype=float)
         return None
 
     @property
@@ -124,7 +479,12 @@ class Spread(object):
         return self.spread['times']
     @times.setter
     def times(self, _list):
-        self.spread['times'] = _list
+        self.spread['times'] = np.asarray(_list, dtype=float)
+
+    def copy(self):
+        """Return a copy of the spread, which shares no series with it."""
+
+        return copy.deepcopy(self)
 
     def plot(self, **kwargs):
         """
@@ -147,6 +507,8 @@ class Spread(object):
 
         """
 
+        import pylab as plt
+
         def calc_error(line, sigma):
             """Calculate and return error for given line and sigma."""
 
@@ -261,7 +623,34 @@ class Spread(object):
         return None
 
     def read(self, _path):
-        """Read spread information from a file at _path."""
+        """
+        Read spread information from a file at _path, which is either
+        in the binary format of save, a .xvg file or in the standard
+        text format.
+
+        """
+
+        def read_npz(_path):
+            """Read series and metadata from the binary .npz format."""
+
+            with np.load(_path) as data:
+                for key in ('times', 'left', 'right', 'com', 'dist'):
+                    setattr(self, key, data[key])
+
+                if 'base' in data:
+                    self.base = str(data['base'])
+                for key in ('delta_t', 'min_mass'):
+                    if key in data:
+                        setattr(self, key, float(data[key]))
+                for key in ('floor', 'last_frame'):
+                    if key in data:
+                        setattr(self, key, int(data[key]))
+                if 'impact' in data:
+                    self.impact = tuple(data['impact'].tolist())
+
+            self._calc_diamrad()
+
+            return None
 
         def read_xvg(_file):
             """
@@ -274,25 +663,19 @@ class Spread(object):
 
             """
 
-            def add_line(time, radius):
-                self.times.append(time)
-                self.radius.append(radius)
-                self.diameter.append(2*radius)
-                self.left.append(-radius)
-                self.right.append(radius)
-                self.com.append(0.)
-                self.dist.append(0.)
-
-                return None
-
-            lines = _file.readlines()
-
-            for line in lines:
-                try:
-                    time, radius = map(float, line.strip().split())
-                    add_line(time, radius)
-                except ValueError:
-                    next
+            # Lines which are not data are comments or graph settings,
+            # empty files give no warning
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                data = np.loadtxt(_file, comments=['#', '@', '&'], ndmin=2)
+            times, radius = data.reshape(-1, 2).T
+
+            self.times = times
+            self.left = -radius
+            self.right = radius
+            self.com = np.zeros(len(times))
+            self.dist = np.zeros(len(times))
+            self._calc_diamrad()
 
             self.floor = 0
             self.delta_t = self.times[-1]/len(self.times)
@@ -305,27 +688,34 @@ class Spread(object):
             line = _file.readline().strip()
 
             while not line.lower().startswith('spread:'):
+                if line.lower().startswith('path'):
+                    self.base = line.split(':', 1)[-1].strip()
                 if line.lower().startswith('floor'):
                     self.floor = int(line.split(':')[-1])
                 if line.lower().startswith('min mass'):
                     self.min_mass = float(line.split(':')[-1])
                 if line.lower().startswith('delta_t'):
                     self.delta_t = float(line.split(':')[-1])
+                if line.lower().startswith('impact'):
+                    self.impact = tuple(float(value)
+                            for value in line.split(':')[-1].split())
+                if line.lower().startswith('last frame'):
+                    self.last_frame = int(line.split(':')[-1])
 
                 line = _file.readline().strip()
 
-            # Append spreading until end of file
+            # Read spreading in one go until end of file
             header = _file.readline().strip().split()
-            line = _file.readline().strip()
-            while line:
-                values = line.split()
-                for i, val in enumerate(values):
-                    if header[i] == 'times':
-                        self.spread[header[i]].append(float(val))
-                    else:
-                        self.spread[header[i]]['val'].append(float(val))
-
-                line = _file.readline().strip()
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                data = np.loadtxt(_file, ndmin=2)
+
+            columns = data.reshape(-1, len(header)).T
+            for key, column in zip(header, columns):
+                if key == 'times':
+                    self.times = column
+                else:
+                    self.spread[key]['val'] = column
 
             self._calc_diamrad()
 
@@ -333,17 +723,49 @@ class Spread(object):
 
         self._reset()
 
-        with open(_path) as _file:
-            if _path.endswith('.xvg'):
-                read_xvg(_file)
-            else:
-                read_std(_file)
+        with open(_path, 'rb') as _file:
+            binary = _file.read(4) == b'PK\x03\x04'
+
+        if binary:
+            read_npz(_path)
+        else:
+            with open(_path) as _file:
+                if _path.endswith('.xvg'):
+                    read_xvg(_file)
+                else:
+                    read_std(_file)
 
 
         return self
 
     def save(self, _path):
-        """Save the spread information to a file at _path."""
+        """
+        Save the spread information to a file at _path. Paths ending
+        with .npz are saved in a binary format which keeps full precision
+        of all values, others in the standard text format.
+
+        """
+
+        def save_npz(_path):
+            """Save series and metadata in the binary .npz format."""
+
+            data = {key: np.asarray(getattr(self, key), dtype=float)
+                    for key in ('times', 'left', 'right', 'com', 'dist')}
+
+            for key in ('base', 'delta_t', 'floor', 'min_mass', 'last_frame'):
+                if getattr(self, key) != None:
+                    data[key] = np.array(getattr(self, key))
+            if self.impact != None:
+                data['impact'] = np.array(self.impact, dtype=float)
+
+            with open(_path, 'wb') as _file:
+                np.savez(_file, **data)
+
+            return None
+
+        if _path.endswith('.npz'):
+            save_npz(_path)
+            return None
 
         with open(_path, 'w') as _file:
             # Write general information
@@ -355,6 +777,11 @@ class Spread(object):
                 _file.write("Floor: %d\n" % self.floor)
             if self.min_mass != None:
                 _file.write("Min mass: %f\n" % self.min_mass)
+            if self.impact != None:
+                _file.write("Impact: %r %r\n" % tuple(float(value)
+                        for value in self.impact))
+            if self.last_frame != None:
+                _file.write("Last frame: %d\n" % self.last_frame)
             _file.write('\n')
 
             # Write header and then fields
@@ -368,16 +795,10 @@ class Spread(object):
             header += '\n'
             _file.write(header)
 
-            for i, _ in enumerate(self.times):
-                line = ("%9.3f %9.3f %9.3f %9.3f %9.3f"
-                        % (
-                            self.left[i], self.right[i], self.com[i],
-                            self.times[i], self.dist[i]
-                            )
-                        )
-
-                line += '\n'
-                _file.write(line)
+            columns = np.column_stack([np.asarray(series, dtype=float)
+                    for series in (self.left, self.right, self.com,
+                        self.times, self.dist)])
+            np.savetxt(_file, columns, fmt='%9.3f')
 
             return None
 
@@ -389,11 +810,11 @@ class Spread(object):
 
         """
 
-        self.times = list(np.array(self.times)/tau)
+        self.times = np.asarray(self.times, dtype=float)/tau
         for _type in ['left', 'right', 'radius', 'diameter', 'dist', 'com']:
             for key in self.spread[_type].keys():
-                self.spread[_type][key] = list(
-                        np.array(self.spread[_type][key])/R
+                self.spread[_type][key] = (
+                        np.asarray(self.spread[_type][key], dtype=float)/R
                         )
 
         return None
@@ -404,34 +825,65 @@ class Spread(object):
 
         """
 
-        times = []
-        for i, _ in enumerate(self.times):
-            times.append(start + i*delta_t)
-
-        self.times = times.copy()
+        self.times = start + delta_t*np.arange(len(self.times))
 
         return None
 
     def _add(self, frame):
-        """Add a frame of spreading."""
+        """
+        Add a frame of spreading. Values are written into a buffer of
+        the series which doubles in size when full, giving amortised
+        constant time appends.
+
+        """
 
         try:
-            self.left.append(frame['left'])
-            self.right.append(frame['right'])
-            self.com.append(frame['com'])
-            self.dist.append(frame['dist'])
-            self.times.append(frame['time'])
+            values = [frame[key] for key in ('time', 'left', 'right', 'com', 'dist')]
         except KeyError:
             raise KeyError("not all values present to add")
 
+        keys = ('times', 'left', 'right', 'com', 'dist')
+        num = len(self.times)
+
+        # Series set from outside are copied into a new buffer
+        if not self._buffered(num):
+            buffer = np.empty((len(keys), max(2*num, 64)))
+            for i, key in enumerate(keys):
+                buffer[i, :num] = getattr(self, key)
+            self._buffer = buffer
+
+        if num == self._buffer.shape[1]:
+            buffer = np.empty((len(keys), 2*num))
+            buffer[:, :num] = self._buffer[:, :num]
+            self._buffer = buffer
+
+        self._buffer[:, num] = values
+        for i, key in enumerate(keys):
+            setattr(self, key, self._buffer[i, :num+1])
+
         return None
 
+    def _buffered(self, num):
+        """Return whether the appended series are views of the buffer."""
+
+        if self._buffer is None:
+            return False
+
+        for key in ('times', 'left', 'right', 'com', 'dist'):
+            series = getattr(self, key)
+            if getattr(series, 'base', None) is not self._buffer or len(series) != num:
+                return False
+
+        return True
+
     def _calc_diamrad(self):
-        """Calculate diameter and radius of spreading lists."""
+        """Calculate diameter and radius of spreading from the edges."""
 
-        for left, right in zip(self.spread['left']['val'], self.spread['right']['val']):
-            self.diameter.append(right - left)
-            self.radius.append(self.diameter[-1]/2)
+        left = np.asarray(self.left, dtype=float)
+        right = np.asarray(self.right, dtype=float)
+
+        self.diameter = right - left
+        self.radius = self.diameter/2
 
         return None
 
@@ -439,11 +891,12 @@ class Spread(object):
         """Reset the system."""
 
         spread = {}
-        spread['times'] = []
+        spread['times'] = np.empty(0)
         for field in ('left', 'right', 'com', 'dist', 'radius', 'diameter'):
-            spread.update({field: {'val': [], 'std_error': []}})
+            spread.update({field: {'val': np.empty(0), 'std_error': np.empty(0)}})
 
         self.spread = spread
+        self._buffer = None
 
         return None
 
@@ -455,6 +908,8 @@ class System(object):
     Can be initialised with keywords as for DataMap.droplet, as well
     as 'floor' for a collective floor of the system, 'datamaps' for
     initial datamaps and 'delta_t' for difference in time between maps.
+    The memory budget in bytes of the frame cache can be set with
+    'cache_bytes' (default: 256 MiB).
 
     Methods:
         base - a base file name
@@ -463,7 +918,16 @@ class System(object):
         droplet_columns - an option for DataMap.droplet
         files - create file names from a base
         floor - the collective floor row number of the system
+        frame_cache - an LRUCache of field arrays read by get_arrays, with
+            counters of hits and misses
+        frames - frame numbers of the files found by files
+        gaps - ranges of missing frame numbers found by files
+        get_arrays - get fields of a DataMap as 2d arrays
         info - collective information of the system
+        iter_frames - iterate over fields of all DataMaps, reading
+            upcoming frames in the background
+        register - register a consumer of frames for run
+        run - run all registered consumers in a single pass over frames
         min_mass - an option for DataMap.droplet
         x - position along x of column
         y - position along y of row
@@ -474,10 +938,14 @@ class System(object):
         self.base = kwargs.pop('base', None)
 
         self.datamaps = kwargs.pop('datamaps', [])
+        self.frames = []
+        self.gaps = []
         self.delta_t = kwargs.pop('delta_t', 0.)
         self.floor = kwargs.pop('floor', None)
         self.min_mass = kwargs.pop('min_mass', 0.)
         self._droplet_columns = kwargs.pop('columns', 1)
+        self.frame_cache = LRUCache(kwargs.pop('cache_bytes', 256*2**20))
+        self.consumers = []
 
         return None
 
@@ -487,44 +955,66 @@ class System(object):
         numbers for start and end. These default to 1 and Infinity,
         meaning that all matches with the provided base will be included.
 
-        Verifies that all files within specified frames exist, only creates
-        file names for those.
+        Frames are found with frames.index_frames by a single read of
+        the directory. Frames are included up to the first missing frame
+        number, unless skip_gaps is set. A warning lists missing frames
+        if any others exist after them. The frame numbers of the files
+        are set as self.frames and ranges of missing numbers as
+        self.gaps.
 
         Keywords:
             base - set a new base file name
             ext - an extension for the file name, defaults to '.dat'
             numdigits - the number of digits included in frame number for
-                file names, defaults to 5
+                file names, defaults to any number
             start - frame number to start from
             end - frame number to end with
+            skip_gaps - True or False (default) to include frames after
+                missing frame numbers
+            cache - True (default) or False to keep the index of frames
+                in the cache directory, if FLOWTOOLS_CACHE_DIR is set
 
         """
 
-        def create(base, frame, numdigits, ext):
-            # Create variable-digits string
-            num = ('%%0%dd' % numdigits) % frame
-            return '%s%s%s' % (base, num, ext)
-
         self.base = kwargs.pop('base', self.base)
         if self.base == None:
             raise KeyError("self.base not set")
 
-        self.datamaps = []
-
         ext = kwargs.pop('ext', '.dat')
-        numdigits = kwargs.pop('numdigits', 5)
+        numdigits = kwargs.pop('numdigits', None)
+        skip_gaps = kwargs.pop('skip_gaps', False)
+        cache = kwargs.pop('cache', True)
 
         self._end = kwargs.pop('end', np.inf)
         self._start = kwargs.pop('start', 1)
 
-        frame = self._start
-        filename = create(self.base, frame, numdigits, ext)
+        frames, files = index_frames(self.base, ext, numdigits, cache)
+        found = [(frame, _file) for frame, _file in zip(frames, files)
+                if self._start <= frame <= self._end]
+
+        # Frames from start, which are missing if the first is not found
+        if found:
+            self.gaps = find_gaps([self._start - 1]
+                    + [frame for frame, _ in found])
+        else:
+            self.gaps = []
 
-        while os.path.isfile(filename) and frame <= self._end:
-            self.datamaps.append(filename)
+        if not skip_gaps:
+            num = 0
+            while num < len(found) and found[num][0] == self._start + num:
+                num += 1
 
-            frame += 1
-            filename = create(self.base, frame, numdigits, ext)
+            if num < len(found):
+                missing = ['%d' % first if first == last
+                        else '%d-%d' % (first, last)
+                        for first, last in self.gaps]
+                warnings.warn("frames after missing frames %s were not "
+                        "included, use skip_gaps to include them"
+                        % ', '.join(missing))
+            found = found[:num]
+
+        self.frames = [frame for frame, _ in found]
+        self.datamaps = [_file for _, _file in found]
 
         return None
 
@@ -543,6 +1033,85 @@ class System(object):
 
         return None
 
+    def get_arrays(self, frame, fields=None):
+        """
+        Return fields of the DataMap at index frame of self.datamaps as
+        a dictionary of 2d arrays as from read_arrays, including 'droplet'
+        cells marked with the options of the system. Defaults to all
+        fields.
+
+        Arrays of all fields are kept in self.frame_cache, so that frames
+        which are revisited are not read again as long as they fit in its
+        memory budget. They are shared between calls and thus read-only.
+
+        """
+
+        from flowtools.derived import frame_droplet
+
+        _path = self.datamaps[frame]
+        key = (file_key(_path), self.min_mass, self._droplet_columns)
+
+        arrays = self.frame_cache.get(key)
+        if arrays == None:
+            arrays = read_arrays(_path)
+            for array in arrays.values():
+                array.flags.writeable = False
+            arrays['droplet'] = frame_droplet(_path, self.min_mass,
+                    self._droplet_columns)
+
+            nbytes = sum(array.nbytes for array in arrays.values())
+            self.frame_cache.put(key, arrays, nbytes)
+
+        if fields == None:
+            fields = list(arrays.keys())
+
+        return {field: arrays[field] for field in fields}
+
+    def iter_frames(self, fields=None, prefetch=2):
+        """
+        Iterate over the DataMaps of the system in order, yielding the
+        index and fields of every frame as from get_arrays.
+
+        The next prefetch frames are read by as many background threads
+        while the current frame is worked on, which overlaps reading with
+        calculations. At most prefetch frames are held in addition to the
+        current one. With prefetch 0 frames are read when asked for.
+
+        Example:
+            for frame, arrays in system.iter_frames(['M', 'U']):
+                shear[frame] = calc(arrays['U'])
+
+        """
+
+        num_frames = len(self.datamaps)
+
+        if prefetch < 1:
+            for frame in range(num_frames):
+                yield frame, self.get_arrays(frame, fields)
+            return
+
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(prefetch) as executor:
+            try:
+                for frame in range(num_frames):
+                    pending.append(executor.submit(self.get_arrays, frame,
+                            fields))
+
+                    # Deliver the oldest once the queue is full
+                    if len(pending) > prefetch:
+                        yield frame - prefetch, pending.popleft().result()
+
+                first = num_frames - len(pending)
+                for frame in range(first, num_frames):
+                    yield frame, pending.popleft().result()
+
+            # Do not read frames after the iteration is stopped early
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        return None
+
     @property
     def info(self):
         """
@@ -557,6 +1126,49 @@ class System(object):
 
         return dict()
 
+    def register(self, consumer):
+        """
+        Register a consumer of frames, which is run with the others by
+        self.run. Consumers are described in flowtools.pipeline.
+
+        """
+
+        self.consumers.append(consumer)
+
+        return None
+
+    def run(self, prefetch=2):
+        """
+        Run all registered consumers in a single pass over the DataMaps of
+        the system. Every frame is read and its 'droplet' cells marked
+        once, then it is given to all consumers in order of registration.
+        Frames are read with prefetch as for self.iter_frames.
+
+        Returns a list of the results of consumers, in order of
+        registration.
+
+        """
+
+        # Read the fields needed by any consumer
+        fields = set()
+        for consumer in self.consumers:
+            if consumer.fields == None:
+                fields = None
+                break
+            fields.update(consumer.fields)
+
+        if fields != None:
+            fields = sorted(fields)
+
+        for consumer in self.consumers:
+            consumer.start(self)
+
+        for frame, arrays in self.iter_frames(fields, prefetch):
+            for consumer in self.consumers:
+                consumer.add(frame, arrays)
+
+        return [consumer.finish() for consumer in self.consumers]
+
     def spread(self, **kwargs):
         """
         Find and return the spreading of a droplet for datamaps in
@@ -621,8 +1233,8 @@ class System(object):
             return edges
 
         self._spread = Spread(
-                min_mass = self.min_mass, delta_t = self.delta_t,
-                floor = self.floor
+                base = self.base, min_mass = self.min_mass,
+                delta_t = self.delta_t, floor = self.floor
                 )
         if self.floor == None:
             raise KeyError("self.floor not set")
@@ -645,22 +1257,38 @@ class System(object):
             if edges:
 
                 # At impact, get center of mass
-                if self._spread.times == []:
+                if len(self._spread.times) == 0:
                     com_impact = DataMap(_file).com
+                    self._spread.impact = (com_impact['X'], com_impact['Y'])
 
                 frame = collect(
                         edges, self.floor, self.delta_t, com_impact, datamap
                         )
                 self._spread._add(frame)
 
+            self._spread.last_frame = self._frame_number(i)
+
         # Calculate diameter and radius of spreading
-        self._spread._calc_diamrad
+        self._spread._calc_diamrad()
 
         if kwargs.get('print', True):
             print()
 
         return self._spread
 
+    def _frame_number(self, index):
+        """
+        Return the frame number of the data map at index, which is known
+        if the files were found from a base, otherwise its position
+        counted from 1.
+
+        """
+
+        if len(self.frames) == len(self.datamaps):
+            return self.frames[index]
+
+        return index + 1
+
 
 class DataMap(object):
     """
@@ -669,7 +1297,9 @@ class DataMap(object):
     Contains cell information in self.cells, arranged into a 2d numpy array
     where the first index contains row and the second column number of cells.
 
-    Keyword arguments can be provided on init as for self.droplet.
+    Keyword arguments can be provided on init as for self.droplet. A coarse
+    grained level of the map saved by save_pyramid can be read by supplying
+    the keyword 'level'.
 
     Example:
         DataMap('include/datamap.dat') returns a DataMap with cells read from
@@ -693,6 +1323,7 @@ class DataMap(object):
         flow - plot flow fields of the map
         fields - get the fields of the droplet
         floor - get the lowest row of the system with 'droplet' cells
+        get_arrays - get fields of all cells as 2d arrays
         info - get information from the DataMap
         interface - get a list of droplet interface coordinates
         mean - get the mean, standard deviation and standard error of some variable
@@ -708,13 +1339,22 @@ class DataMap(object):
     def __init__(self, _path=None, **kwargs):
         self.fields = kwargs.pop('fields', 'all')
         self.path = _path
+        self._droplet_options = None
+
+        level = kwargs.pop('level', 1)
+        if self.path:
+            self.path = pyramid_filename(self.path, level)
 
         # Read if given path, otherwise keep empty
         if self.path:
-            self._read()
+            table = self._read()
             self._info = self.info
             self._grid()
-            self.droplet(**kwargs)
+
+            if 'M' in self.fields:
+                self._read_droplet(table, **kwargs)
+            else:
+                self.droplet(**kwargs)
 
         return None
 
@@ -1111,6 +1751,9 @@ class DataMap(object):
         Draw the density map of the data map.
 
         Keywords:
+            lod - a maximum number of cells to draw, if the map is larger
+                cells are combined as by downsample() after min_mass is
+                applied to the original cells
             min_frac - a minimum fraction to include
             min_mass - a minimum mass to include.
             norm - a mass value which will be set as '1' in the plot.
@@ -1118,6 +1761,8 @@ class DataMap(object):
 
         """
 
+        import pylab as plt
+
         @draw
         def plot(**kwargs):
             """Plot maps using hist2d."""
@@ -1127,8 +1772,7 @@ class DataMap(object):
             mass = kwargs.pop('mass', [])
 
             # Get bins from system
-            num_cells = list(self._info['cells']['num_cells'].values())
-            num_cells.reverse()
+            num_cells = kwargs.pop('num_cells')
 
             # Get minimum to draw, prioritise fraction
             min_frac = kwargs.pop('min_mass')
@@ -1144,20 +1788,34 @@ class DataMap(object):
             return None
 
         min_mass = kwargs.setdefault('min_mass', 0.)
+        lod = kwargs.pop('lod', None)
 
         # Collect 'droplet' cells into arrays
         x = []
         y = []
         mass = []
 
-        for row in self.cells:
-            for cell in row:
-                x.append(cell['X'])
-                y.append(cell['Y'])
-                if cell['droplet'] and cell['M'] >= min_mass:
-                    mass.append(cell['M'])
-                else:
-                    mass.append(-1.)
+        if lod != None:
+            arrays = self._lod_arrays(['X', 'Y', 'M'], min_mass, lod)
+
+            x = list(arrays['X'].transpose().ravel())
+            y = list(arrays['Y'].transpose().ravel())
+            mass = list(np.where(arrays['droplet'], arrays['M'], -1.)
+                    .transpose().ravel())
+            num_cells = list(reversed(arrays['M'].shape))
+
+        else:
+            for row in self.cells:
+                for cell in row:
+                    x.append(cell['X'])
+                    y.append(cell['Y'])
+                    if cell['droplet'] and cell['M'] >= min_mass:
+                        mass.append(cell['M'])
+                    else:
+                        mass.append(-1.)
+
+            num_cells = list(self._info['cells']['num_cells'].values())
+            num_cells.reverse()
 
         # Get and apply density normalising
         norm = kwargs.pop('norm', max(mass))
@@ -1168,6 +1826,7 @@ class DataMap(object):
         kwargs.update({'x': x})
         kwargs.update({'y': y})
         kwargs.update({'mass': mass})
+        kwargs.update({'num_cells': num_cells})
 
         plot(**kwargs)
 
@@ -1183,6 +1842,8 @@ class DataMap(object):
 
         """
 
+        import pylab as plt
+
         @draw
         def plot(**kwargs):
             X = kwargs.get('X')
@@ -1228,6 +1889,7 @@ class DataMap(object):
         # Read arguments
         min_mass = kwargs.pop('min_mass', 0.)
         columns = kwargs.pop('columns', 1)
+        self._droplet_options = (min_mass, columns)
 
         # Call controllers in order
         #self._cells_flow()
@@ -1245,6 +1907,9 @@ class DataMap(object):
 
         Keywords:
             color - color the arrows.
+            lod - a maximum number of cells to draw arrows for, if the map
+                is larger cells are combined as by downsample() after
+                min_mass is applied to the original cells
             min_mass - include only cells with a minimum mass.
             temp - color quiver arrows by their temperature.
             xlim, ylim - cut the plot view.
@@ -1252,6 +1917,8 @@ class DataMap(object):
 
         """
 
+        import pylab as plt
+
         @draw
         def plot(**kwargs):
             """Draw a quiver field of vectors."""
@@ -1277,15 +1944,28 @@ class DataMap(object):
         t = []
 
         min_mass = kwargs.pop('min_mass', 0.)
+        lod = kwargs.pop('lod', None)
 
-        for row in self.cells:
-            for cell in row:
-                if cell['droplet'] and cell['M'] >= min_mass:
-                    x.append(cell['X'])
-                    y.append(cell['Y'])
-                    u.append(cell['U'])
-                    v.append(cell['V'])
-                    t.append(cell['T'])
+        if lod != None:
+            arrays = self._lod_arrays(['X', 'Y', 'M', 'N', 'T', 'U', 'V'],
+                    min_mass, lod)
+            include = arrays['droplet']
+
+            x = list(arrays['X'][include])
+            y = list(arrays['Y'][include])
+            u = list(arrays['U'][include])
+            v = list(arrays['V'][include])
+            t = list(arrays['T'][include])
+
+        else:
+            for row in self.cells:
+                for cell in row:
+                    if cell['droplet'] and cell['M'] >= min_mass:
+                        x.append(cell['X'])
+                        y.append(cell['Y'])
+                        u.append(cell['U'])
+                        v.append(cell['V'])
+                        t.append(cell['T'])
 
         # Set some defaults if not input
         kwargs.update({
@@ -1303,6 +1983,28 @@ class DataMap(object):
 
         return None
 
+    def get_arrays(self, fields=None):
+        """
+        Return fields of all cells as a dictionary of 2d arrays, arranged
+        as self.cells. Defaults to all fields of the cells, including
+        'droplet'.
+
+        See also:
+            read_arrays()
+
+        """
+
+        if fields == None:
+            fields = list(self.cells[0][0].keys())
+
+        arrays = {}
+        for field in fields:
+            arrays[field] = np.array(
+                    [[cell[field] for cell in row] for row in self.cells]
+                    )
+
+        return arrays
+
     def interface(self, get_cell_numbers=False):
         """
         Find interface cells of droplets and return ordered list of
@@ -1844,99 +2546,95 @@ class DataMap(object):
 
         return length
 
-    def _read(self):
-        """
-        Reads information from the data map. Saves cell array in self.cells.
-
+    def _lod_arrays(self, fields, min_mass, lod):
         """
+        Return arrays of fields combined into at most lod cells by
+        downsample, for drawing at a level of detail. Only 'droplet' cells
+        with at least min_mass are included: the mass and number of atoms
+        of other cells are zeroed before cells are combined, and a
+        combined cell is 'droplet' if any included cell is.
 
-        def is_binary(_path, checksize=512):
-            """
-            Returns True of data file is binary format, else False.
+        Maps read from a file are read again as arrays with read_arrays
+        and the memoised droplet mask, which avoids going through the
+        cells.
 
-            """
+        """
 
-            with open(_path, 'r') as _file:
-                try:
-                    line = _file.read(checksize)
-                    if '\n' in line:
-                        return False
-                    else:
-                        raise UnicodeDecodeError
+        if self.path and self._droplet_options != None:
+            from flowtools.derived import frame_droplet
 
-                except UnicodeDecodeError:
-                    return True
+            arrays = read_arrays(self.path, fields)
+            arrays['droplet'] = frame_droplet(self.path,
+                    *self._droplet_options)
+        else:
+            arrays = self.get_arrays(fields + ['droplet'])
 
-        def read_binary(_path, bytes_per_val=4):
-            """
-            Read the data from a binary data file.
+        include = arrays['droplet'] & (arrays['M'] >= min_mass)
+        arrays['droplet'] = include
+        for field in ('M', 'N'):
+            if field in arrays:
+                arrays[field] = np.where(include, arrays[field], 0.)
 
-            """
+        arrays, _ = downsample(arrays, lod)
 
-            def bytes_from_file(_path, chunksize=7168):
-                """
-                Read and return chunks of bytes from file.
+        return arrays
 
-                """
+    def _read_droplet(self, table, **kwargs):
+        """
+        Mark 'droplet' cells of a map read from file as DataMap.droplet
+        with the same keywords, using the mask memoised by
+        derived.frame_droplet. If it is not memoised the mask is found
+        from the masses in table, as returned by _read.
 
-                with open(_path, 'rb') as _file:
-                    while True:
-                        chunk = _file.read(chunksize)
-                        if chunk:
-                            yield chunk
-                        else:
-                            break
+        """
 
-                return None
+        from flowtools.derived import frame_droplet
 
-            # Order of fields must not change
-            fields = ['X', 'Y', 'N', 'T', 'M', 'U', 'V']
-            data = {field: None for field in fields}
-            size = bytes_per_val * len(fields)
-            cells = []
+        min_mass = kwargs.pop('min_mass', 0.)
+        columns = kwargs.pop('columns', 1)
 
-            for chunk in bytes_from_file(_path):
-                lines = [chunk[i:i+size] for i in range(0, len(chunk), size)]
-                for line in lines:
-                    for i, value in enumerate(struct.unpack('fffffff', line)):
-                        data[fields[i]] = value
-                    cells.append(data.copy())
+        def masses():
+            return _table_arrays(*table, ['M'])['M']
 
-            return cells
+        mask = frame_droplet(self.path, min_mass, columns, masses)
+        self._droplet_options = (min_mass, columns)
+        for cell, droplet in zip(self.cells.flat, mask.ravel().tolist()):
+            cell['droplet'] = droplet
 
-        def read_plaintext(_path, fields):
-            """
-            Read the data from a plain text data file.
+        return None
 
-            """
+    def _read(self):
+        """
+        Reads information from the data map. Saves cell array in self.cells
+        and returns the header and data table of the file.
 
-            data = {field: None for field in fields}
-            cells = []
+        """
 
-            with open(_path, 'r') as _file:
-                # Assert that header contains desired fields
-                header = _file.readline().strip().upper().split()
-                if not fields.issubset(header):
-                    raise Exception
+        header, data = read_table(self.path)
 
-                # Read in header order until EOF
-                line = _file.readline().strip().split()
-                while line:
-                    for i, add in enumerate(line):
-                        if header[i] in self.fields:
-                            data[header[i]] = float(add)
-                    cells.append(data.copy())
-                    line = _file.readline().strip().split()
+        # Binary files (read as single precision) hold all fields, plain
+        # text only those of the map
+        if data.dtype == np.float32:
+            keys = header
+            empty = dict.fromkeys(header)
+        else:
+            if not self.fields.issubset(header):
+                raise Exception
+            keys = [field for field in header if field in self.fields]
+            empty = dict.fromkeys(self.fields)
 
-            return cells
+        columns = [data[:, header.index(field)].tolist() for field in keys]
 
-        if is_binary(self.path):
-            cells = read_binary(self.path)
-        else:
-            cells = read_plaintext(self.path, self.fields)
+        cells = []
+        for values in zip(*columns):
+            cell = empty.copy()
+            cell.update(zip(keys, values))
+            cells.append(cell)
 
         self.cells = np.array(cells)
 
+        return header, data
+
     def _grid(self):
         """Rearrange data map cells into 2d numpy array."""
 
@@ -0,0 +1,109 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Quantities derived from data map files, memoised across calls.
+
+Derived arrays are kept by the identity of the file they were calculated
+from, the operation and its parameters. They are held in memory by
+derived_cache and, if the environment variable FLOWTOOLS_CACHE_DIR is
+set, also stored by disk_cache, which shares them between scripts. This
+is the datamaps.frame_cache of parsed maps, so that derived arrays and
+maps share the one size budget. Returned arrays are read-only.
+
+Functions:
+    frame_droplet - get the droplet mask of a data map file
+    memoize - get a derived array of a file, calculating it if not cached
+
+"""
+
+from flowtools.cache import LRUCache, file_key
+from flowtools.datamaps import droplet_mask, frame_cache, read_arrays
+
+import numbers
+import numpy as np
+
+# Derived arrays by (file key, operation, parameters)
+derived_cache = LRUCache()
+
+# Stored with the parsed maps, within the same size budget
+disk_cache = frame_cache
+
+def frame_droplet(_path, min_mass=0., columns=1, masses=None):
+    """
+    Return the 'droplet' cells of the data map at _path as a boolean 2d
+    array, as from droplet_mask with options min_mass and columns.
+
+    If the mask is not cached it is found from the masses of the map,
+    which are read from the file unless a function returning them as a
+    2d array is given as masses.
+
+    """
+
+    def calculate():
+        if masses == None:
+            return droplet_mask(read_arrays(_path, ['M'])['M'], min_mass,
+                    columns)
+        return droplet_mask(masses(), min_mass, columns)
+
+    return memoize(_path, 'droplet', calculate,
+            min_mass=min_mass, columns=columns)
+
+def memoize(_path, operation, calculate, **params):
+    """
+    Return the array derived by operation with keyword params from the
+    file at _path. If it is not cached, or the file has been modified
+    since, it is calculated by calling calculate() and cached.
+
+    Example:
+        memoize(_path, 'droplet', calculate, min_mass=25.) returns the
+        cached result of calculate() for the file at _path as long as
+        the file and min_mass are unchanged.
+
+    """
+
+    key = (file_key(_path), operation, tuple(sorted(
+            (name, _normalise(value)) for name, value in params.items())))
+
+    value = derived_cache.get(key)
+    if value is None:
+        value = disk_cache.get(key)
+        if value is None:
+            value = np.asarray(calculate())
+            disk_cache.put(key, value)
+        else:
+            value = np.asarray(value)
+
+        # Cached arrays are shared between callers
+        value.flags.writeable = False
+        derived_cache.put(key, value, value.nbytes)
+
+    return value
+
+def _normalise(value):
+    """
+    Return a parameter value in a form with the same repr for equal
+    values, so that keys of the memory and disk caches agree: numbers
+    as float, whether given as int, float or numpy scalar.
+
+    """
+
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, numbers.Real):
+        return float(value)
+
+    return value
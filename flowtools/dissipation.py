@@ -0,0 +1,196 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Energy dissipation in data maps, calculated on field arrays.
+
+Energies are given in MD units (kJ*mol-1), as for
+DataMap._calc_viscous_dissipation.
+
+Functions:
+    dissipation_series - calculate the dissipation of a set of data maps
+        in parallel, optionally writing to a file as frames are done
+    frame_dissipation - calculate the viscous and slip dissipation of a map
+    frame_viscous_dissipation - get the memoised viscous dissipation of
+        all cells of a map
+    slip_dissipation - calculate the dissipation due to slip at a floor
+    viscous_dissipation - calculate the viscous dissipation of all cells
+
+"""
+
+from flowtools.datamaps import read_arrays
+from flowtools.derived import frame_droplet, memoize
+
+import functools
+import multiprocessing
+import numpy as np
+
+def viscous_dissipation(arrays, droplet, N=1, viscosity=0.642e-3,
+        width=1., delta_t=1., mass_flow=False):
+    """
+    Calculate the viscous energy dissipation for each cell of field arrays
+    (as from read_arrays) with given viscosity by taking finite central
+    differences over surrounding N cells. Returns a 2d array of dissipation,
+    which is zero for cells outside of the droplet or closer than N cells
+    to the system border.
+
+    Options are as for DataMap._calc_viscous_dissipation and give an
+    identical result.
+
+    """
+
+    def central_difference(direction, axis, dx):
+        """
+        Calculate the central difference of flow along axis for all cells
+        at least N cells inside of the system border.
+
+        """
+
+        flow = arrays[direction]
+        mass = arrays['M']
+
+        lower = [slice(N, -N), slice(N, -N)]
+        upper = [slice(N, -N), slice(N, -N)]
+        lower[axis] = slice(None, -2*N)
+        upper[axis] = slice(2*N, None)
+        lower = tuple(lower)
+        upper = tuple(upper)
+
+        if not mass_flow:
+            difference = flow[upper] - flow[lower]
+        else:
+            total_mass = mass[upper] + mass[lower]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                difference = np.where(total_mass != 0.,
+                        (mass[upper]*flow[upper] - mass[lower]*flow[lower])
+                        /total_mass, 0.)
+
+        return difference/(2*N*dx)
+
+    # Maps too small for the differences have no dissipation
+    dissipation = np.zeros(droplet.shape)
+    if N < 1 or min(droplet.shape) <= 2*N:
+        return dissipation
+
+    # Convert viscosity from Pa*s to MD units kJ*ps*mol-1*nm-3
+    viscosity = viscosity*(1e6/1.66054)
+
+    dx = arrays['X'][0, 1] - arrays['X'][0, 0]
+    dy = arrays['Y'][1, 0] - arrays['Y'][0, 0]
+    volume = dx*dy*width
+
+    dudx = central_difference('U', 1, dx)
+    dvdx = central_difference('V', 1, dx)
+    dudy = central_difference('U', 0, dy)
+    dvdy = central_difference('V', 0, dy)
+
+    dissipation_per_time_and_volume = viscosity*(2*(dudx**2 + dvdy**2
+            - (1/3)*(dudx + dvdy)**2) + (dudy + dvdx)**2)
+
+    inside = droplet[N:-N, N:-N]
+    dissipation[N:-N, N:-N] = np.where(inside,
+            dissipation_per_time_and_volume*volume*delta_t, 0.)
+
+    return dissipation
+
+def slip_dissipation(arrays, droplet, floor):
+    """
+    Calculate the energy dissipated due to slip between the active wetting
+    layer, which is the layer just above floor, and the floor layer.
+
+    """
+
+    layer = floor + 1
+    energy = 0.5*(arrays['M'][layer]*arrays['U'][layer]**2
+            - arrays['M'][floor]*arrays['U'][floor]**2)
+
+    return energy[droplet[layer]].sum()
+
+def frame_dissipation(_path, min_mass=0., columns=1, floor=None, **kwargs):
+    """
+    Read the data map at _path and return its total viscous dissipation
+    and dissipation due to slip at floor. If floor is None the slip
+    dissipation is returned as NaN.
+
+    Keywords min_mass and columns are used as for DataMap.droplet, others
+    are as for viscous_dissipation.
+
+    """
+
+    viscous = frame_viscous_dissipation(_path, min_mass, columns,
+            **kwargs).sum()
+
+    if floor is None:
+        slip = np.nan
+    else:
+        arrays = read_arrays(_path, ['M', 'U'])
+        droplet = frame_droplet(_path, min_mass, columns)
+        slip = slip_dissipation(arrays, droplet, floor)
+
+    return viscous, slip
+
+def frame_viscous_dissipation(_path, min_mass=0., columns=1, **kwargs):
+    """
+    Return the viscous dissipation of all cells of the data map at _path
+    as from viscous_dissipation, with 'droplet' cells as for
+    DataMap.droplet with options min_mass and columns. The result is
+    memoised with derived.memoize.
+
+    Other keywords are as for viscous_dissipation.
+
+    """
+
+    def calculate():
+        arrays = read_arrays(_path, ['X', 'Y', 'M', 'U', 'V'])
+        droplet = frame_droplet(_path, min_mass, columns)
+        return viscous_dissipation(arrays, droplet, **kwargs)
+
+    return memoize(_path, 'viscous_dissipation', calculate,
+            min_mass=min_mass, columns=columns, **kwargs)
+
+def dissipation_series(files, times, output=None, processes=None,
+        chunksize=4, **kwargs):
+    """
+    Calculate the viscous and slip dissipation of all data map files,
+    distributing frames over a pool of processes. Returns an array with
+    rows of (time, viscous, slip) in frame order.
+
+    Keywords:
+        output - an open file to write rows of the table to as frames
+            are finished, in order
+        processes - number of processes to use, defaults to the number
+            of available cores, 1 calculates in this process
+        chunksize - number of frames sent to a process at a time
+        Others as for frame_dissipation.
+
+    """
+
+    calc = functools.partial(frame_dissipation, **kwargs)
+
+    def write(rows):
+        for time, (viscous, slip) in zip(times, rows):
+            if output != None:
+                output.write("%g %g %g\n" % (time, viscous, slip))
+                output.flush()
+            yield time, viscous, slip
+
+    if processes == 1:
+        table = list(write(map(calc, files)))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            table = list(write(pool.imap(calc, files, chunksize)))
+
+    return np.array(table).reshape(-1, 3)
@@ -17,17 +17,26 @@
 """
 Functions for drawing images.
 
+Plotting modules are imported when first drawing, so that importing
+this module (and modules using it) does not load matplotlib.
+
+Classes:
+    ColourMesh - a colour mesh of field values, reused for many frames
+    FlowQuiver - a quiver of flow on a grid, reused for many frames
+
 Functions:
     draw - a decorator for figures
 
 """
 
-import pylab as plt
+import numpy as np
 
 def draw(func):
     """Decorator for giving common plot options."""
 
     def wrapper(**kwargs):
+        import pylab as plt
+
         # Read options
         axis = kwargs.pop('axis', 'scaled')
         colorbar = kwargs.pop('colorbar', False)
@@ -100,9 +109,261 @@ def plot_line(**kwargs):
 
         """
 
+    import pylab as plt
+
     domain = kwargs.pop('domain')
     line = kwargs.pop('line')
 
     plt.plot(domain, line, **kwargs)
 
     return None
+
+class ColourMesh(object):
+    """
+    A colour mesh of field values on a fixed grid of cells, for drawing
+    many frames of the same system.
+
+    The figure, axes, mesh and colorbar are created when drawing the first
+    frame and are then reused, for following frames only the values of the
+    mesh are updated. Colour limits which are not fixed by keywords vmin
+    and vmax follow the values of every frame.
+
+    Example:
+        mesh = ColourMesh(arrays['X'], arrays['Y'], vmin=0.)
+        for values in frames:
+            mesh.draw(values)
+            mesh.save(path)
+
+    Keywords:
+        axis - axis mode (default: 'scaled')
+        colorbar - True (default) or False to draw a colorbar
+        noaxis - True or False (default) to draw without axis
+        vmin, vmax - fixed colour limits
+        xlabel, ylabel, title - labels of the figure
+        xlim, ylim - limits of the view
+        Others as for pcolormesh.
+
+    Methods:
+        draw - draw a frame of values
+        save - save the figure of the current frame
+        show - show the figure of the current frame
+
+    """
+
+    def __init__(self, x, y, **kwargs):
+        self.edges = {'X': self._edges(np.asarray(x)[0, :]),
+                'Y': self._edges(np.asarray(y)[:, 0])}
+
+        self.axis = kwargs.pop('axis', 'scaled')
+        self.colorbar = kwargs.pop('colorbar', True)
+        self.noaxis = kwargs.pop('noaxis', False)
+        self.labels = {
+                'xlabel': kwargs.pop('xlabel', 'Position (nm)'),
+                'ylabel': kwargs.pop('ylabel', 'Height (nm)'),
+                'title': kwargs.pop('title', '')
+                }
+        self.xlim = kwargs.pop('xlim', None)
+        self.ylim = kwargs.pop('ylim', None)
+        self.clim = [kwargs.pop('vmin', None), kwargs.pop('vmax', None)]
+        self.options = kwargs
+
+        self.figure = None
+        self.mesh = None
+
+        return None
+
+    def draw(self, values):
+        """Draw a frame of values, a 2d array with the grid shape."""
+
+        values = np.asarray(values)
+
+        if self.mesh is None:
+            self._create(values)
+        else:
+            self.mesh.set_array(values.ravel())
+
+        # Update colour limits which are not fixed
+        clim = [
+                np.nanmin(values) if self.clim[0] is None else self.clim[0],
+                np.nanmax(values) if self.clim[1] is None else self.clim[1]
+                ]
+        self.mesh.set_clim(clim)
+
+        return None
+
+    def save(self, _path, dpi=150, transparent=False):
+        """Save the figure of the current frame to a file at _path."""
+
+        self.figure.savefig(_path, dpi=dpi, transparent=transparent)
+
+        return None
+
+    def show(self):
+        """Show the figure of the current frame."""
+
+        import pylab as plt
+
+        plt.figure(self.figure.number)
+        plt.show()
+
+        return None
+
+    def _create(self, values):
+        """Create figure, axes, mesh and colorbar for the first frame."""
+
+        import pylab as plt
+
+        self.figure = plt.figure()
+        axes = self.figure.add_subplot(1, 1, 1)
+
+        self.mesh = axes.pcolormesh(self.edges['X'], self.edges['Y'], values,
+                **self.options)
+
+        axes.set_xlabel(self.labels['xlabel'])
+        axes.set_ylabel(self.labels['ylabel'])
+        axes.set_title(self.labels['title'])
+        axes.axis(self.axis)
+        axes.set_xlim(self.xlim)
+        axes.set_ylim(self.ylim)
+
+        if self.colorbar:
+            self.figure.colorbar(self.mesh, ax=axes)
+        if self.noaxis:
+            axes.axis('off')
+
+        return None
+
+    def _edges(self, centres):
+        """Return cell edges from a regular array of cell centres."""
+
+        if len(centres) > 1:
+            size = centres[1] - centres[0]
+        else:
+            size = 1.
+
+        return np.append(centres - size/2, centres[-1] + size/2)
+
+class FlowQuiver(object):
+    """
+    A quiver of flow vectors on a fixed grid of cells, for drawing many
+    frames of the same system.
+
+    The figure, axes and quiver are created with an arrow for every cell
+    when drawing the first frame and are then reused, for following frames
+    only the vectors (and colours) are updated. Cells are left out of a
+    frame by masking them. The arrow scale is set by the first frame if
+    not given, so that arrows of all frames compare.
+
+    Keywords:
+        axis - axis mode (default: 'scaled')
+        clim - colour limits for temperature
+        color - arrow colour (default: 'blue')
+        colorbar - True or False to draw a colorbar, defaults to temp
+        noaxis - True or False (default) to draw without axis
+        temp - True or False (default) to colour arrows by temperature
+        xlabel, ylabel, title - labels of the figure
+        xlim, ylim - limits of the view, default to the system size
+        Others as for quiver.
+
+    Methods:
+        draw - draw a frame of flow
+        save - save the figure of the current frame
+        show - show the figure of the current frame
+
+    """
+
+    def __init__(self, x, y, **kwargs):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+
+        self.axis = kwargs.pop('axis', 'scaled')
+        self.clim = kwargs.pop('clim', None)
+        self.temp = kwargs.pop('temp', False)
+        self.colorbar = kwargs.pop('colorbar', self.temp)
+        self.noaxis = kwargs.pop('noaxis', False)
+        self.labels = {
+                'xlabel': kwargs.pop('xlabel', 'Position (nm)'),
+                'ylabel': kwargs.pop('ylabel', 'Height (nm)'),
+                'title': kwargs.pop('title', 'Flow of droplet on substrate')
+                }
+        self.xlim = kwargs.pop('xlim', [self.x.min(), self.x.max()])
+        self.ylim = kwargs.pop('ylim', [self.y.min(), self.y.max()])
+        kwargs.setdefault('color', 'blue')
+        self.options = kwargs
+
+        self.figure = None
+        self.quiver = None
+
+        return None
+
+    def draw(self, u, v, t=None, mask=None):
+        """
+        Draw a frame of flow u and v, 2d arrays with the grid shape. Cells
+        where mask is True are not drawn. Arrows are coloured by t if
+        drawing with temperature.
+
+        """
+
+        if mask is None:
+            mask = np.zeros(self.x.shape, dtype=bool)
+
+        u = np.ma.masked_array(u, mask=mask)
+        v = np.ma.masked_array(v, mask=mask)
+        if self.temp:
+            t = np.ma.masked_array(t, mask=mask)
+
+        if self.quiver is None:
+            self._create(u, v, t)
+        elif self.temp:
+            self.quiver.set_UVC(u, v, t)
+        else:
+            self.quiver.set_UVC(u, v)
+
+        return None
+
+    def save(self, _path, dpi=150, transparent=False):
+        """Save the figure of the current frame to a file at _path."""
+
+        self.figure.savefig(_path, dpi=dpi, transparent=transparent)
+
+        return None
+
+    def show(self):
+        """Show the figure of the current frame."""
+
+        import pylab as plt
+
+        plt.figure(self.figure.number)
+        plt.show()
+
+        return None
+
+    def _create(self, u, v, t):
+        """Create figure, axes, quiver and colorbar for the first frame."""
+
+        import pylab as plt
+
+        self.figure = plt.figure()
+        axes = self.figure.add_subplot(1, 1, 1)
+
+        if self.temp:
+            self.options.pop('color')
+            self.quiver = axes.quiver(self.x, self.y, u, v, t, **self.options)
+            if self.clim != None:
+                self.quiver.set_clim(self.clim)
+        else:
+            self.quiver = axes.quiver(self.x, self.y, u, v, **self.options)
+
+        axes.set_xlabel(self.labels['xlabel'])
+        axes.set_ylabel(self.labels['ylabel'])
+        axes.set_title(self.labels['title'])
+        axes.axis(self.axis)
+        axes.set_xlim(self.xlim)
+        axes.set_ylim(self.ylim)
+
+        if self.colorbar:
+            self.figure.colorbar(self.quiver, ax=axes)
+        if self.noaxis:
+            axes.axis('off')
+
+        return None
@@ -0,0 +1,266 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Ensembles of spreading runs aligned on a shared time axis.
+
+Aligned series are kept as 2d arrays with runs along the first and times
+along the second index, so statistics of all runs and fields are
+calculated in single reductions.
+
+Functions:
+    align - align the series of a set of spreads on a shared time axis
+    ensemble_stats - calculate the mean, standard deviation and standard
+        error of aligned series
+    first_crossing - find the times at which series first cross a threshold
+    fit_power_law - fit power laws to series in log-log space
+    stack_series - stack series of different lengths into a padded 2d array
+
+"""
+
+import numpy as np
+
+FIELDS = ('left', 'right', 'com', 'dist', 'radius', 'diameter')
+
+def align(spreads, shift=None, fields=FIELDS, interpolate=False,
+        complete=True):
+    """
+    Align the series of fields of Spread objects on a shared time axis,
+    after subtracting the corresponding value of shift from the times of
+    every spread. Returns the time axis and a dictionary with a 2d array
+    for every field, with runs along the first index and NaN where a run
+    has no value.
+
+    By default the time axis is the union of all times and values are
+    placed at exactly matching times. With interpolate the series are
+    instead linearly interpolated onto the union of times in the range
+    covered by every run.
+
+    Keywords:
+        complete - True (default) or False to keep only times where all
+            runs have values, if there is more than one run
+
+    """
+
+    if shift is None:
+        shift = np.zeros(len(spreads))
+
+    times = [np.asarray(spread.times, dtype=float) - delta
+            for spread, delta in zip(spreads, shift)]
+
+    if times:
+        axis = np.unique(np.concatenate(times))
+    else:
+        axis = np.empty(0)
+
+    if interpolate:
+        lower = max([t.min() if t.size else np.inf for t in times],
+                default=np.inf)
+        upper = min([t.max() if t.size else -np.inf for t in times],
+                default=-np.inf)
+        axis = axis[(axis >= lower) & (axis <= upper)]
+
+    # Fields along the first, runs along the second and times along the third
+    block = np.full((len(fields), len(spreads), len(axis)), np.nan)
+
+    for i, (spread, t) in enumerate(zip(spreads, times)):
+        series = np.array([
+                np.asarray(spread.spread[field]['val'], dtype=float)
+                for field in fields
+                ]).reshape(len(fields), -1)
+
+        if interpolate:
+            if not axis.size:
+                continue
+            order = np.argsort(t, kind='stable')
+            for j, values in enumerate(series):
+                block[j, i] = np.interp(axis, t[order], values[order])
+        else:
+            block[:, i, np.searchsorted(axis, t)] = series
+
+    if complete and len(spreads) > 1:
+        keep = ~np.isnan(block).any(axis=(0, 1))
+        axis = axis[keep]
+        block = block[:, :, keep]
+
+    return axis, dict(zip(fields, block))
+
+def ensemble_stats(values):
+    """
+    Calculate the mean, standard deviation and standard error over runs
+    of aligned series (as from align) at every time, for all fields at
+    once. NaN values are left out.
+
+    Returns a dictionary with a dictionary for every field, with arrays of
+    the mean as 'val', the standard deviation as 'std', the standard error
+    as 'std_error' and the number of runs with values as 'num'.
+
+    """
+
+    fields = list(values.keys())
+    if not fields:
+        return {}
+
+    block = np.array([values[field] for field in fields], dtype=float)
+    present = ~np.isnan(block)
+    num = present.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(present, block, 0.).sum(axis=1)/num
+        deviation = np.where(present, block - mean[:, np.newaxis, :], 0.)
+        std = np.sqrt((deviation**2).sum(axis=1)/(num - 1))
+        std_error = std/np.sqrt(num)
+
+    std[num < 2] = np.nan
+    std_error[num < 2] = np.nan
+
+    stats = {}
+    for i, field in enumerate(fields):
+        stats[field] = {
+                'val': mean[i], 'std': std[i], 'std_error': std_error[i],
+                'num': num[i]
+                }
+
+    return stats
+
+def first_crossing(times, values, threshold, below=False, interpolate=False):
+    """
+    Find the time at which every series of values (a row of a 2d array
+    as from stack_series) first reaches or exceeds threshold, or with
+    below first reaches or falls below it. Returns an array of times.
+
+    Series which never cross the threshold get the time of their closest
+    approach to it. With interpolate the crossing time is linearly
+    interpolated between the frames before and after the crossing.
+
+    """
+
+    times = np.atleast_2d(np.asarray(times, dtype=float))
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    rows = np.arange(len(values))
+
+    with np.errstate(invalid='ignore'):
+        if below:
+            crossed = values <= threshold
+        else:
+            crossed = values >= threshold
+
+    gap = np.abs(values - threshold)
+    closest = np.where(np.isnan(gap), np.inf, gap).argmin(axis=1)
+
+    found = crossed.any(axis=1)
+    index = np.where(found, crossed.argmax(axis=1), closest)
+    crossing = times[rows, index]
+
+    if interpolate:
+        inside = found & (index > 0)
+        rows, index = rows[inside], index[inside]
+
+        before = values[rows, index - 1]
+        after = values[rows, index]
+        fraction = (threshold - before)/(after - before)
+
+        start = times[rows, index - 1]
+        crossing[inside] = start + fraction*(times[rows, index] - start)
+
+    return crossing
+
+def fit_power_law(times, radius, tend=np.inf, tendlog=np.inf):
+    """
+    Fit power laws R = C * (t ** n) to every series of radius against
+    times (rows of 2d arrays as from stack_series), as straight lines
+    log10(R) = log10(C) + n*log10(t) with least squares in closed form.
+
+    As in f_spread_fit the first frame of every series is left out, which
+    is the impact at time zero for series shifted to it. Series are cut
+    before the first time larger than tend, and before the first log10
+    time larger than tendlog. These can be arrays to fit a grid of
+    windows at once, which gives results with the shape of the broadcast
+    windows followed by the number of series.
+
+    Returns a dictionary with arrays of the amplitude C as 'amp', the
+    exponent n as 'index', their standard errors as 'amp_error' and
+    'index_error', the covariance matrix of (log10(C), n) as 'covariance',
+    the number of fitted points as 'num' and a mask of which points from
+    the second frame on were fitted as 'window'.
+
+    """
+
+    times = np.atleast_2d(np.asarray(times, dtype=float))
+    radius = np.atleast_2d(np.asarray(radius, dtype=float))
+
+    # Windows broadcast against series and frames
+    tend, tendlog = np.broadcast_arrays(tend, tendlog)
+    tend = tend[..., np.newaxis, np.newaxis]
+    tendlog = tendlog[..., np.newaxis, np.newaxis]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = np.log10(times[:, 1:])
+        y = np.log10(radius[:, 1:])
+
+        inside = np.cumprod(times <= tend, axis=-1)[..., 1:].astype(bool)
+        inside &= np.cumprod(x <= tendlog, axis=-1).astype(bool)
+    inside &= np.isfinite(x) & np.isfinite(y)
+
+    x = np.where(inside, x, 0.)
+    y = np.where(inside, y, 0.)
+    num = inside.sum(axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = x.sum(axis=-1)/num
+        y_mean = y.sum(axis=-1)/num
+        dx = np.where(inside, x - x_mean[..., np.newaxis], 0.)
+        dy = np.where(inside, y - y_mean[..., np.newaxis], 0.)
+
+        sxx = (dx**2).sum(axis=-1)
+        index = (dx*dy).sum(axis=-1)/sxx
+        intercept = y_mean - index*x_mean
+
+        residual = np.where(inside, dy - index[..., np.newaxis]*dx, 0.)
+        variance = (residual**2).sum(axis=-1)/(num - 2)
+
+        covariance = np.empty(index.shape + (2, 2))
+        covariance[..., 0, 0] = variance*(1/num + x_mean**2/sxx)
+        covariance[..., 0, 1] = -variance*x_mean/sxx
+        covariance[..., 1, 0] = covariance[..., 0, 1]
+        covariance[..., 1, 1] = variance/sxx
+
+    amp = 10**intercept
+
+    return {
+            'amp': amp,
+            'index': index,
+            'amp_error': amp*np.log(10)*np.sqrt(covariance[..., 0, 0]),
+            'index_error': np.sqrt(covariance[..., 1, 1]),
+            'covariance': covariance,
+            'num': num,
+            'window': inside
+            }
+
+def stack_series(series):
+    """
+    Stack a list of 1d series into a 2d array with one series per row,
+    padding shorter series with NaN at the end.
+
+    """
+
+    width = max([len(values) for values in series], default=0)
+    stack = np.full((len(series), width), np.nan)
+
+    for i, values in enumerate(series):
+        stack[i, :len(values)] = values
+
+    return stack
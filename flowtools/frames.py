@@ -0,0 +1,165 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Discovery of numbered frame files in a directory.
+
+The files of frames are found by reading their directory once and
+parsing frame numbers from the names, instead of checking whether every
+candidate file exists. If the environment variable FLOWTOOLS_CACHE_DIR
+is set, the index of a directory is kept in a small file in its
+subdirectory 'frames' and reused for as long as the directory is
+unmodified. Nothing is written to the directories of frames.
+
+Functions:
+    find_gaps - find ranges of missing frame numbers
+    index_frames - get the sorted frame numbers and files of a base name
+
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+
+# Directory of the index files of frame directories, disabled if None
+if os.environ.get('FLOWTOOLS_CACHE_DIR') != None:
+    index_directory = os.path.join(os.environ['FLOWTOOLS_CACHE_DIR'], 'frames')
+else:
+    index_directory = None
+
+# Directories modified this close to a read may have been modified again
+# within the same timestamp, so their index is not reused
+MTIME_MARGIN_NS = 2*10**9
+
+def find_gaps(frames):
+    """
+    Return a list of (first, last) ranges of frame numbers which are
+    missing between the first and last of sorted frames.
+
+    """
+
+    gaps = []
+    for previous, current in zip(frames[:-1], frames[1:]):
+        if current > previous + 1:
+            gaps.append((previous + 1, current - 1))
+
+    return gaps
+
+def index_frames(base, ext='.dat', numdigits=None, cache=True):
+    """
+    Find all files of frames with names of base followed by a frame
+    number and ext, by a single read of the directory. Returns a sorted
+    list of frame numbers and a list of the corresponding file names.
+
+    If numdigits is given only frame numbers of exactly that many digits
+    are matched, otherwise any number of digits is. If several files have
+    the same frame number the first in name order is used.
+
+    With cache and an index_directory set, the index is read from and
+    written to a file there, which is used as long as the modification
+    time of the directory is unchanged. An index is only stored if the
+    directory had not been modified within MTIME_MARGIN_NS before it was
+    read, since files added within the same tick of a coarse timestamp
+    do not change the modification time. Failures to write are ignored.
+
+    """
+
+    directory, prefix = os.path.split(base)
+    if numdigits == None:
+        digits = r'(\d+)'
+    else:
+        digits = r'(\d{%d})' % numdigits
+    pattern = re.compile(re.escape(prefix) + digits + re.escape(ext) + '$')
+
+    key = '%s|%s|%s' % (prefix, ext, numdigits)
+
+    # Modification time before reading, so that files added during the
+    # read make the stored index outdated
+    read_ns = time.time_ns()
+    mtime = os.stat(directory or os.curdir).st_mtime_ns
+
+    index = {}
+    if cache and index_directory != None:
+        name = hashlib.sha1(
+                os.path.abspath(directory or os.curdir).encode()).hexdigest()
+        _path = os.path.join(index_directory, name + '.json')
+        index = _read_index(_path, mtime)
+    else:
+        cache = False
+
+    if key in index:
+        frames, names = index[key]
+    else:
+        found = {}
+        with os.scandir(directory or os.curdir) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                match = pattern.match(entry.name)
+                if match and entry.is_file():
+                    found.setdefault(int(match.group(1)), entry.name)
+
+        frames = sorted(found)
+        names = [found[frame] for frame in frames]
+
+        if cache and read_ns - mtime > MTIME_MARGIN_NS:
+            index[key] = (frames, names)
+            _write_index(_path, mtime, index)
+
+    files = [os.path.join(directory, name) for name in names]
+
+    return frames, files
+
+def _read_index(_path, mtime):
+    """
+    Return the dictionary of indices in an index file if it was written
+    for a directory modification time of mtime, otherwise an empty one.
+
+    """
+
+    try:
+        with open(_path) as _file:
+            stored = json.load(_file)
+    except (OSError, ValueError):
+        return {}
+
+    if stored.get('mtime_ns') != mtime:
+        return {}
+
+    return {key: tuple(value) for key, value in stored['index'].items()}
+
+def _write_index(_path, mtime, index):
+    """
+    Write the dictionary of indices to an index file for a directory
+    modification time of mtime, through a temporary file so that other
+    processes never read a partial one.
+
+    """
+
+    temporary = '%s.%d.tmp' % (_path, os.getpid())
+
+    try:
+        os.makedirs(os.path.dirname(_path), exist_ok=True)
+        with open(temporary, 'w') as _file:
+            json.dump({'mtime_ns': mtime, 'index': index}, _file)
+        os.replace(temporary, _path)
+    except OSError:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+    return None
@@ -0,0 +1,386 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Analyses of all frames of a system in a single pass.
+
+A consumer is an object which analyses the frames of a System one at a
+time. Consumers are registered with System.register and run together by
+System.run, which reads every frame and marks its droplet cells once,
+then hands it to all consumers. A consumer has:
+
+    fields - list of fields it needs from frames, or None for all
+    start(system) - called with the system before the first frame
+    add(frame, arrays) - called in order with the index and fields of
+        every frame, as from System.get_arrays
+    finish() - called after the last frame, writes any output and
+        returns the result
+
+Example:
+    system.register(SpreadConsumer('spread.dat'))
+    system.register(ShearConsumer('shear.npz', floor=1))
+    spread, shear = system.run()
+
+Classes:
+    DissipationConsumer - viscous and slip dissipation of frames
+    InterfaceConsumer - interface lengths or contact angles of frames
+    ShearConsumer - shear between two rows of frames
+    SpreadConsumer - spreading of the droplet, as System.spread
+
+Functions:
+    interface_coordinates - get the coordinates of interface cells
+
+"""
+
+from flowtools.datamaps import Spread, droplet_mask
+from flowtools.dissipation import slip_dissipation, viscous_dissipation
+from flowtools.shear import shear_rate
+
+import numpy as np
+
+class DissipationConsumer(object):
+    """
+    Calculate the viscous dissipation of frames and the dissipation due to
+    slip at floor, as dissipation.frame_dissipation. The result is an
+    array with rows of (time, viscous, slip), where the slip dissipation
+    is NaN if floor is None.
+
+    Keywords:
+        output - path of a file to write rows of the result to as frames
+            are done, as f_viscous_dissipation
+        time_start - time of the first frame (default: 0)
+        floor - floor row for the slip dissipation
+        Others as for dissipation.viscous_dissipation, where delta_t is
+        also the time between frames.
+
+    """
+
+    fields = ['X', 'Y', 'M', 'U', 'V', 'droplet']
+
+    def __init__(self, output=None, time_start=0., floor=None, **kwargs):
+        self.output = output
+        self.time_start = time_start
+        self.floor = floor
+        self.options = kwargs
+
+        return None
+
+    def start(self, system):
+        self.rows = []
+        self._file = None
+        if self.output:
+            self._file = open(self.output, 'w')
+
+        return None
+
+    def add(self, frame, arrays):
+        droplet = arrays['droplet']
+        time = frame*self.options.get('delta_t', 1.) + self.time_start
+
+        viscous = viscous_dissipation(arrays, droplet, **self.options).sum()
+        if self.floor is None:
+            slip = np.nan
+        else:
+            slip = slip_dissipation(arrays, droplet, self.floor)
+
+        self.rows.append((time, viscous, slip))
+        if self._file != None:
+            self._file.write("%g %g %g\n" % (time, viscous, slip))
+            self._file.flush()
+
+        return None
+
+    def finish(self):
+        if self._file != None:
+            self._file.close()
+
+        return np.array(self.rows).reshape(-1, 3)
+
+class InterfaceConsumer(object):
+    """
+    Calculate the interface length or contact angles of frames, as
+    render.InterfaceFrame without drawing. The result is a list with the
+    values of every frame.
+
+    Keywords:
+        output - path of a file to write the values of every frame to,
+            as printed by f_interface
+        length - True or False (default) to calculate interface lengths
+        angle - True or False (default) to calculate contact angles
+        floor, num_layers - options for DataMap.contactangle
+        mean - True or False (default) to use the mean of angles
+
+    """
+
+    fields = ['X', 'Y', 'droplet']
+
+    def __init__(self, output=None, **kwargs):
+        self.output = output
+        self.length = kwargs.pop('length', False)
+        self.angle = kwargs.pop('angle', False)
+        self.floor = kwargs.pop('floor', 0)
+        self.num_layers = kwargs.pop('num_layers', 1)
+        self.mean = kwargs.pop('mean', False)
+
+        return None
+
+    def start(self, system):
+        self.values = []
+
+        return None
+
+    def add(self, frame, arrays):
+        interface = interface_coordinates(arrays)
+
+        values = []
+        if self.length:
+            values.append(_interface_length(interface))
+
+        if self.angle:
+            try:
+                ca = _contact_angles(interface, self.num_layers, self.floor)
+            except Exception:
+                ca = [0, 0]
+
+            if not self.mean:
+                values.extend(ca)
+            else:
+                values.append(np.mean(ca))
+
+        self.values.append(values)
+
+        return None
+
+    def finish(self):
+        if self.output:
+            with open(self.output, 'w') as _file:
+                for values in self.values:
+                    if values:
+                        _file.write(' '.join(str(v) for v in values) + '\n')
+
+        return self.values
+
+class ShearConsumer(object):
+    """
+    Calculate the shear between row floor and the row num_rows above it
+    in frames, as shear.read_shear. The result is the times of frames, the
+    masked shear array with frames along the first and columns along the
+    second index, and the x positions of columns.
+
+    Keywords:
+        output - path to save the result to in the .npz format, as
+            f_shearmax
+        floor - lower row (default: 0)
+        num_rows - number of rows between the rows (default: 1)
+        delta_t - time between frames, the time of a frame is its frame
+            number times this (default: 1)
+
+    """
+
+    fields = ['X', 'Y', 'U', 'droplet']
+
+    def __init__(self, output=None, floor=0, num_rows=1, delta_t=1.):
+        self.output = output
+        self.floor = floor
+        self.ceil = floor + num_rows
+        self.delta_t = delta_t
+
+        return None
+
+    def start(self, system):
+        self.rows = {'U': [], 'droplet': []}
+        self.x = None
+        self.dy = None
+
+        frames = [system._frame_number(i) for i in range(len(system.datamaps))]
+        self.times = np.array(frames, dtype=int)*self.delta_t
+
+        return None
+
+    def add(self, frame, arrays):
+        if self.x is None:
+            self.x = arrays['X'][0, :]
+            self.dy = arrays['Y'][1, 0] - arrays['Y'][0, 0]
+
+        rows = [self.floor, self.ceil]
+        self.rows['U'].append(arrays['U'][rows, :])
+        self.rows['droplet'].append(arrays['droplet'][rows, :])
+
+        return None
+
+    def finish(self):
+        if self.x is None:
+            shear = np.ma.masked_array(np.empty((0, 0)))
+            self.x = np.empty(0)
+        else:
+            shear = shear_rate(self.rows['U'], self.rows['droplet'], 0, 1,
+                    self.dy)
+
+        if self.output:
+            np.savez(self.output, times=self.times, x=self.x,
+                    shear=shear.filled(np.nan))
+
+        return self.times, shear, self.x
+
+class SpreadConsumer(object):
+    """
+    Collect the spreading of the droplet at the floor row of the system,
+    as System.spread. The result is a Spread object.
+
+    Keywords:
+        output - path to save the spread to
+        time_start - if given, times of the spread are set from this and
+            the delta_t of the system with Spread.time_set, as
+            f_collect_spread
+
+    """
+
+    fields = ['X', 'Y', 'M', 'droplet']
+
+    def __init__(self, output=None, time_start=None):
+        self.output = output
+        self.time_start = time_start
+
+        return None
+
+    def start(self, system):
+        if system.floor == None:
+            raise KeyError("floor of system not set")
+
+        self.system = system
+        self.floor = system.floor
+        self.delta_t = system.delta_t
+        self.impact = None
+        self.spread = Spread(
+                base = system.base, min_mass = system.min_mass,
+                delta_t = system.delta_t, floor = system.floor
+                )
+
+        return None
+
+    def add(self, frame, arrays):
+        columns = np.flatnonzero(arrays['droplet'][self.floor])
+
+        # If edges found, collect and append frame information
+        if columns.size:
+            x = arrays['X'][0, :]
+            size = x[1] - x[0]
+
+            # Center of mass at impact is of all cells with mass
+            if self.impact is None:
+                self.impact = _com(arrays, droplet_mask(arrays['M']))
+                self.spread.impact = self.impact
+
+            com = _com(arrays, arrays['droplet'])
+            self.spread._add({
+                    'left': (x[columns[0]] - size/2) - self.impact[0],
+                    'right': (x[columns[-1]] + size/2) - self.impact[0],
+                    'com': com[0],
+                    'time': (frame + 1)*self.delta_t,
+                    'dist': com[1] - arrays['Y'][self.floor, 0]
+                    })
+
+        self.spread.last_frame = self.system._frame_number(frame)
+
+        return None
+
+    def finish(self):
+        self.spread._calc_diamrad()
+
+        if self.time_start != None:
+            self.spread.time_set(start=self.time_start, delta_t=self.delta_t)
+
+        if self.output:
+            self.spread.save(self.output)
+
+        return self.spread
+
+def interface_coordinates(arrays):
+    """
+    Return the coordinates of the interface cells of field arrays (as
+    from System.get_arrays) as a 2d array with a row of (X, Y) for every
+    cell, ordered as DataMap.interface from the left edge of the bottom
+    row to the right edge of it.
+
+    """
+
+    droplet = arrays['droplet']
+    rows = np.flatnonzero(droplet.any(axis=1))
+
+    left = droplet[rows].argmax(axis=1)
+    right = droplet.shape[1] - 1 - droplet[rows, ::-1].argmax(axis=1)
+
+    rows = np.concatenate([rows, rows[::-1]])
+    columns = np.concatenate([left, right[::-1]])
+
+    return np.column_stack([arrays['X'][rows, columns],
+            arrays['Y'][rows, columns]])
+
+def _com(arrays, droplet):
+    """
+    Return the (X, Y) center of mass of droplet cells, summed in the
+    order of the data map file as DataMap.com.
+
+    """
+
+    # Cumulative sums add values in order, unlike sums
+    mass = arrays['M'].transpose()[droplet.transpose()]
+    total = np.cumsum(mass)[-1]
+
+    return tuple(
+            float(np.cumsum(arrays[field].transpose()[droplet.transpose()]
+                *mass)[-1]/total)
+            for field in ('X', 'Y'))
+
+def _contact_angles(interface, num_layers=1, floor=0):
+    """
+    Return the left and right contact angles in degrees of interface
+    coordinates, as DataMap.contactangle.
+
+    """
+
+    def angle(cells, mid):
+        dx = np.abs(mid - cells['bottom'][0]) - np.abs(mid - cells['top'][0])
+        dy = cells['top'][1] - cells['bottom'][1]
+        return np.arccos(dx/np.sqrt(dx**2 + dy**2))*180/np.pi
+
+    if floor < 0 or num_layers < 1:
+        raise Exception(
+            "Angles can only be calculated if floor (%d) is non-negative "
+            "and num_layers (%d) is positive integer" % (floor, num_layers)
+            )
+
+    if floor+num_layers > len(interface)/2:
+        raise Exception("Trying to calculate angle from cells outside of droplet height")
+
+    left = {'bottom': interface[floor], 'top': interface[floor+num_layers]}
+    right = {'bottom': interface[-(floor+1)], 'top': interface[-(floor+num_layers+1)]}
+    mid = (right['bottom'][0] + left['bottom'][0])/2
+
+    return [angle(cell, mid) for cell in [left, right]]
+
+def _interface_length(interface):
+    """
+    Return the total length of interface coordinates, summed in order as
+    DataMap._interface_length.
+
+    """
+
+    steps = np.diff(interface, axis=0)
+    if not len(steps):
+        return 0.
+
+    return 0. + np.cumsum(np.sqrt(steps[:, 0]**2 + steps[:, 1]**2))[-1]
@@ -0,0 +1,143 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Profiles of fields along rows or columns of data maps.
+
+All functions work on stacks of field arrays, where the last two indices
+are the row and column of cells as in DataMap.cells and any leading index
+is the frame number.
+
+Functions:
+    combine_profiles - combine profiles of several frames into one
+    fit_linear - closed form least squares fit of a straight line
+    profile - get the mean, standard deviation, count and standard error
+        of a field along rows or columns
+    read_stack - read fields of several data maps into stacked arrays
+
+"""
+
+from flowtools.datamaps import read_arrays
+
+import numpy as np
+
+def read_stack(files, fields=['U'], mass=True):
+    """
+    Read fields of all data maps in files into a dictionary of arrays
+    with shape (frames, rows, columns). The mass field 'M' is included
+    by default for masking, supply mass=False to not read it.
+
+    """
+
+    fields = list(fields)
+    if mass and 'M' not in fields:
+        fields.append('M')
+
+    frames = [read_arrays(_file, fields) for _file in files]
+    stack = {field: np.array([frame[field] for frame in frames])
+            for field in fields}
+
+    return stack
+
+def profile(values, mask=None, axis='row', fill=None):
+    """
+    Calculate the profile of values along rows or columns, for every
+    frame in the stack. Returns a dictionary with arrays of the 'mean',
+    'std' (standard deviation), 'count' (number of included cells) and
+    'error' (standard error), with the reduced row or column index last.
+
+    Keywords:
+        mask - boolean array of the cells to include, defaults to all
+        axis - 'row' (default) for one value per row, or 'column'
+        fill - if not None, cells outside of the mask are set to this value
+            and included in the mean and deviation instead of being left out
+
+    Example:
+        profile(stack['U'], stack['M'] > 0.)['mean'][:, 10] returns the mean
+        flow along x in the eleventh row for all frames.
+
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    if mask is None:
+        mask = np.ones(values.shape, dtype=bool)
+
+    if axis == 'row':
+        reduce_axis = -1
+    elif axis == 'column':
+        reduce_axis = -2
+    else:
+        raise KeyError("profile axis has to be 'row' or 'column'")
+
+    count = mask.sum(axis=reduce_axis)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if fill is None:
+            num = count
+            values = np.where(mask, values, 0.)
+        else:
+            num = values.shape[reduce_axis]
+            values = np.where(mask, values, fill)
+
+        mean = values.sum(axis=reduce_axis)/num
+        deviation = values - np.expand_dims(mean, reduce_axis)
+        if fill is None:
+            deviation = np.where(mask, deviation, 0.)
+
+        std = np.sqrt((deviation**2).sum(axis=reduce_axis)/num)
+        error = std/np.sqrt(count)
+
+    return {'mean': mean, 'std': std, 'count': count, 'error': error}
+
+def combine_profiles(profiles):
+    """
+    Combine the profiles of several frames into a single profile, as
+    returned by profile(). The combined 'mean' and 'count' are means over
+    frames, the 'std' is the deviation of the frame means and 'error' the
+    standard error of the combined mean.
+
+    """
+
+    num_frames = profiles['mean'].shape[0]
+
+    combined = {
+            'mean': profiles['mean'].mean(axis=0),
+            'count': profiles['count'].mean(axis=0),
+            'std': profiles['mean'].std(axis=0)
+            }
+    combined['error'] = combined['std']/np.sqrt(num_frames)
+
+    return combined
+
+def fit_linear(x, y):
+    """
+    Fit y = A + B*x in closed form using least squares, return A and B.
+
+    Fitting is done along the last axis, so several lines can be fitted
+    at once by supplying arrays with leading dimensions.
+
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    dx = x - x.mean(axis=-1, keepdims=True)
+    dy = y - y.mean(axis=-1, keepdims=True)
+
+    B = (dx*dy).sum(axis=-1)/(dx**2).sum(axis=-1)
+    A = y.mean(axis=-1) - B*x.mean(axis=-1)
+
+    return A, B
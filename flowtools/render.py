@@ -0,0 +1,367 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Rendering of data map frames to images, optionally in parallel.
+
+A renderer is a callable renderer(_file, save) which draws the data map
+at _file and saves the image to save (if not empty), returning anything
+that should be reported back for the frame. When rendering in parallel
+every worker process gets its own copy of the renderer, which thus keeps
+its own figure between frames.
+
+Classes:
+    ColourMapFrame - draw colour meshes of a field
+    FlowFrame - draw flow fields using DataMap.flow
+    InterfaceFrame - draw droplet interfaces, optionally with lengths and
+        contact angles
+    QuiverFrame - draw flow fields with a quiver updated in place
+
+Functions:
+    animate - write frames drawn by a renderer to an animation file
+    frame_filename - get the image file name of a frame
+    read_colourmap - read positions and values of a colour map quantity
+    render - render frames with a renderer, in parallel over processes
+
+"""
+
+from flowtools.datamaps import DataMap, downsample, read_arrays
+from flowtools.derived import frame_droplet
+from flowtools.draw import ColourMesh, FlowQuiver
+from flowtools.shear import frame_shear
+
+import multiprocessing
+import numpy as np
+import os
+
+def animate(renderer, files, _path, fps=10, dpi=150, writer=None):
+    """
+    Draw all data map files with renderer and write them as frames of an
+    animation to a file at _path. The renderer must keep its figure as
+    the attribute 'figure', as ColourMapFrame and QuiverFrame do.
+
+    Keywords:
+        fps - frames per second (default: 10)
+        dpi - output dpi (default: 150)
+        writer - name of a matplotlib animation writer, defaults to 'pillow'
+            for .gif files and 'ffmpeg' for others
+
+    """
+
+    import matplotlib.animation as animation
+
+    if writer == None:
+        if os.path.splitext(_path)[1].lower() == '.gif':
+            writer = 'pillow'
+        else:
+            writer = 'ffmpeg'
+
+    if not animation.writers.is_available(writer):
+        raise KeyError("animation writer '%s' not available" % writer)
+    movie = animation.writers[writer](fps=fps)
+
+    if not files:
+        return None
+
+    # The figure is created when drawing the first frame
+    renderer(files[0], '')
+
+    with movie.saving(renderer.figure, _path, dpi):
+        movie.grab_frame()
+
+        for _file in files[1:]:
+            renderer(_file, '')
+            movie.grab_frame()
+
+    return None
+
+def frame_filename(base, frame, ext='.png'):
+    """Return the image file name of a frame number from a base."""
+
+    return '%s%05d%s' % (base, frame, ext)
+
+def read_colourmap(_file, quantity, min_mass=0., shear_numcells=1,
+        shear_massflow=False, lod=None):
+    """
+    Read the 2d arrays of X and Y positions and values of a quantity of
+    'mass', 'number', 'temp' or 'shear' from a data map file.
+
+    If a maximum number of cells is given as lod, larger maps are combined
+    into fewer cells using downsample. Shear is calculated before cells
+    are combined.
+
+    """
+
+    # Set quantity keyword
+    for value, keyword in zip(['mass', 'number', 'temp', 'shear'], ['M', 'N', 'T', 'shear']):
+        if quantity == value:
+            _type = keyword
+
+    if _type == 'shear':
+        arrays = read_arrays(_file, ['X', 'Y'])
+        arrays['shear'] = frame_shear(_file, shear_numcells, shear_massflow,
+                min_mass)
+    elif _type == 'T':
+        arrays = read_arrays(_file, ['X', 'Y', 'N', 'T'])
+    else:
+        arrays = read_arrays(_file, ['X', 'Y', _type])
+
+    if lod != None:
+        arrays, _ = downsample(arrays, lod)
+
+    return arrays['X'], arrays['Y'], arrays[_type]
+
+def render(renderer, files, saves, processes=1, chunksize=1):
+    """
+    Render all data map files with renderer, saving images to the
+    corresponding paths in saves. Returns an iterator over the renderer
+    results in frame order.
+
+    With more than one process, frames are distributed over a pool of
+    worker processes drawing with the Agg backend. Processes defaults
+    to 1, which renders in this process with the current backend.
+
+    """
+
+    jobs = list(zip(files, saves))
+
+    if processes == 1:
+        for _file, save in jobs:
+            yield renderer(_file, save)
+        return
+
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+            initargs=(renderer, )) as pool:
+        for result in pool.imap(_render_job, jobs, chunksize):
+            yield result
+
+    return
+
+class ColourMapFrame(object):
+    """
+    Renderer of colour meshes of a quantity, see read_colourmap. The mesh
+    is created for the first frame and updated for following frames.
+
+    Keywords:
+        min_mass, shear_numcells, shear_massflow, lod - as for read_colourmap
+        dpi - output image dpi (default: 150)
+        transparent - True or False (default) for transparent background
+        show - True or False (default) to show every frame
+        Others as for draw.ColourMesh.
+
+    """
+
+    def __init__(self, quantity, **kwargs):
+        self.quantity = quantity
+        self.read_options = {key: kwargs.pop(key) for key in
+                ['min_mass', 'shear_numcells', 'shear_massflow', 'lod']
+                if key in kwargs}
+        self.dpi = kwargs.pop('dpi', 150)
+        self.transparent = kwargs.pop('transparent', False)
+        self.show = kwargs.pop('show', False)
+        self.options = kwargs
+        self.mesh = None
+
+        return None
+
+    @property
+    def figure(self):
+        return self.mesh.figure
+
+    def __call__(self, _file, save):
+        x, y, values = read_colourmap(_file, self.quantity, **self.read_options)
+
+        if self.mesh == None:
+            self.mesh = ColourMesh(x, y, **self.options)
+
+        self.mesh.draw(values)
+
+        if save:
+            self.mesh.save(save, dpi=self.dpi, transparent=self.transparent)
+        if self.show:
+            self.mesh.show()
+
+        return None
+
+class FlowFrame(object):
+    """
+    Renderer of flow fields using DataMap.flow, which clears the figure
+    after saving.
+
+    Keywords:
+        min_mass - minimum mass of 'droplet' cells
+        Others as for DataMap.flow.
+
+    """
+
+    def __init__(self, min_mass=0., **kwargs):
+        self.min_mass = min_mass
+        self.options = kwargs
+
+        return None
+
+    def __call__(self, _file, save):
+        datamap = DataMap(_file, min_mass=self.min_mass)
+        datamap.flow(save=save, **self.options)
+
+        return None
+
+class InterfaceFrame(object):
+    """
+    Renderer of droplet interfaces using DataMap.draw_interface. Returns
+    a list of the interface length or contact angles of the frame if
+    asked for, otherwise an empty list.
+
+    Keywords:
+        min_mass - minimum mass of 'droplet' cells
+        length - True or False (default) to return the interface length
+        angle - True or False (default) to return the contact angles
+        floor, num_layers - options for DataMap.contactangle
+        mean - True or False (default) to return the mean of angles
+        axis, xlim, ylim, xlabel, ylabel, title - figure options
+        dpi - output image dpi (default: 150)
+        show - True or False (default) to show every frame
+
+    """
+
+    def __init__(self, **kwargs):
+        self.min_mass = kwargs.pop('min_mass', 0.)
+        self.length = kwargs.pop('length', False)
+        self.angle = kwargs.pop('angle', False)
+        self.floor = kwargs.pop('floor', 0)
+        self.num_layers = kwargs.pop('num_layers', 1)
+        self.mean = kwargs.pop('mean', False)
+        self.axis = kwargs.pop('axis', 'scaled')
+        self.xlim = kwargs.pop('xlim', None)
+        self.ylim = kwargs.pop('ylim', None)
+        self.labels = {
+                'xlabel': kwargs.pop('xlabel', 'Position (nm)'),
+                'ylabel': kwargs.pop('ylabel', 'Height (nm)'),
+                'title': kwargs.pop('title', '')
+                }
+        self.dpi = kwargs.pop('dpi', 150)
+        self.show = kwargs.pop('show', False)
+
+        return None
+
+    def __call__(self, _file, save):
+        import pylab as plt
+
+        datamap = DataMap(_file, min_mass=self.min_mass)
+        datamap.draw_interface()
+
+        plt.axis(self.axis)
+        plt.xlim(self.xlim)
+        plt.ylim(self.ylim)
+        plt.xlabel(self.labels['xlabel'])
+        plt.ylabel(self.labels['ylabel'])
+        plt.title(self.labels['title'])
+
+        output = []
+        if self.length:
+            output.append(datamap._interface_length())
+
+        if self.angle:
+            try:
+                ca = datamap.contactangle(self.num_layers, self.floor)
+            except Exception:
+                ca = [0, 0]
+
+            if not self.mean:
+                output.extend(ca)
+            else:
+                output.append(np.mean(ca))
+
+        if self.show:
+            plt.show()
+
+        if save:
+            plt.savefig(save, dpi=self.dpi)
+
+        plt.clf()
+
+        return output
+
+class QuiverFrame(object):
+    """
+    Renderer of flow fields with a quiver of all cells, which is created
+    for the first frame and then updated with the flow of following frames.
+    Cells which are not 'droplet' cells are masked.
+
+    Keywords:
+        min_mass - minimum mass of 'droplet' cells
+        lod - a maximum number of arrows, larger maps are combined into
+            fewer cells using downsample
+        dpi - output image dpi (default: 150)
+        transparent - True or False (default) for transparent background
+        show - True or False (default) to show every frame
+        Others as for draw.FlowQuiver.
+
+    """
+
+    def __init__(self, min_mass=0., lod=None, **kwargs):
+        self.min_mass = min_mass
+        self.lod = lod
+        self.dpi = kwargs.pop('dpi', 150)
+        self.transparent = kwargs.pop('transparent', False)
+        self.show = kwargs.pop('show', False)
+        self.options = kwargs
+        self.quiver = None
+
+        return None
+
+    @property
+    def figure(self):
+        return self.quiver.figure
+
+    def __call__(self, _file, save):
+        arrays = read_arrays(_file, ['X', 'Y', 'M', 'N', 'T', 'U', 'V'])
+        arrays['droplet'] = frame_droplet(_file, self.min_mass)
+
+        if self.lod != None:
+            arrays, _ = downsample(arrays, self.lod)
+
+        if self.quiver == None:
+            self.quiver = FlowQuiver(arrays['X'], arrays['Y'], **self.options)
+
+        self.quiver.draw(arrays['U'], arrays['V'], arrays['T'],
+                mask=~arrays['droplet'])
+
+        if save:
+            self.quiver.save(save, dpi=self.dpi, transparent=self.transparent)
+        if self.show:
+            self.quiver.show()
+
+        return None
+
+_renderer = None
+
+def _init_worker(renderer):
+    """Set up a worker process to draw headless with its own renderer."""
+
+    global _renderer
+
+    import pylab as plt
+    plt.switch_backend('Agg')
+
+    _renderer = renderer
+
+    return None
+
+def _render_job(job):
+    """Render a job of (_file, save) with the renderer of this worker."""
+
+    return _renderer(*job)
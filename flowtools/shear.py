@@ -0,0 +1,185 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Shear rates between rows of data maps.
+
+Functions:
+    cell_shear - calculate the fluid shear inside all cells
+    frame_shear - get the memoised shear inside all cells of a data map
+    max_shear - get the maximum shear and its position for every frame
+    read_shear - read the shear between two rows for a set of data maps
+    shear_rate - calculate the shear between two rows of flow arrays
+
+"""
+
+from flowtools.datamaps import System, read_arrays
+from flowtools.derived import frame_droplet, memoize
+
+import numpy as np
+
+def cell_shear(arrays, droplet, N=1, mass_flow=False):
+    """
+    Calculate the fluid shear inside all cells of field arrays (as from
+    read_arrays) by taking finite central differences over surrounding N
+    cells. Returns a 2d array of shear in 1/ps, which is zero for cells
+    where any of the cells in the differences are not part of the droplet.
+
+    Options are as for DataMap._calc_cell_shear and give an identical
+    result.
+
+    """
+
+    def central_difference(direction, axis, dx):
+        """
+        Calculate the central difference of flow along axis for all cells
+        at least N cells inside of the system border, together with whether
+        both cells in the difference are droplet cells.
+
+        """
+
+        lower = [slice(N, -N), slice(N, -N)]
+        upper = [slice(N, -N), slice(N, -N)]
+        lower[axis] = slice(None, -2*N)
+        upper[axis] = slice(2*N, None)
+        lower = tuple(lower)
+        upper = tuple(upper)
+
+        flow = arrays[direction]
+        mass = arrays['M']
+
+        if not mass_flow:
+            difference = flow[upper] - flow[lower]
+        else:
+            total_mass = mass[upper] + mass[lower]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                difference = np.where(total_mass != 0.,
+                        (mass[upper]*flow[upper] - mass[lower]*flow[lower])
+                        /total_mass, 0.)
+
+        return difference/(2*N*dx), droplet[upper] & droplet[lower]
+
+    shear = np.zeros(droplet.shape)
+    if N < 1 or min(droplet.shape) <= 2*N:
+        return shear
+
+    dx = arrays['X'][0, 1] - arrays['X'][0, 0]
+    dy = arrays['Y'][1, 0] - arrays['Y'][0, 0]
+
+    dudx, inside_x = central_difference('U', 1, dx)
+    dvdx, _ = central_difference('V', 1, dx)
+    dudy, inside_y = central_difference('U', 0, dy)
+    dvdy, _ = central_difference('V', 0, dy)
+
+    with np.errstate(invalid='ignore'):
+        interior = np.sqrt(2*(dudx**2 + dvdy**2 - (1/3)*(dudx + dvdy)**2)
+                + (dudy + dvdx)**2)
+
+    inside = droplet[N:-N, N:-N] & inside_x & inside_y
+    shear[N:-N, N:-N] = np.where(inside, interior, 0.)
+
+    return shear
+
+def frame_shear(_path, N=1, mass_flow=False, min_mass=0., columns=1):
+    """
+    Return the shear inside all cells of the data map at _path as from
+    cell_shear, with 'droplet' cells as for DataMap.droplet with options
+    min_mass and columns. The result is memoised with derived.memoize.
+
+    """
+
+    def calculate():
+        arrays = read_arrays(_path, ['X', 'Y', 'M', 'U', 'V'])
+        droplet = frame_droplet(_path, min_mass, columns)
+        return cell_shear(arrays, droplet, N, mass_flow)
+
+    return memoize(_path, 'shear', calculate, N=N, mass_flow=mass_flow,
+            min_mass=min_mass, columns=columns)
+
+def shear_rate(flow, droplet, floor, ceil, dy):
+    """
+    Calculate the shear |U[ceil] - U[floor]|/dy between the rows floor and
+    ceil of flow arrays, for all columns at once. Flow and droplet can be
+    stacks of frames, with rows and columns as the two last indices.
+
+    Returns a masked array where columns in which either cell is not
+    part of the droplet are masked.
+
+    """
+
+    flow = np.asarray(flow)
+    droplet = np.asarray(droplet)
+
+    mask = ~(droplet[..., floor, :] & droplet[..., ceil, :])
+    shear = np.abs(flow[..., ceil, :] - flow[..., floor, :])/dy
+
+    return np.ma.masked_array(shear, mask=mask)
+
+def max_shear(shear, x):
+    """
+    Return the maximum shear of every frame in a masked shear array
+    and the x positions of the columns they were found in. Frames without
+    any droplet columns are masked.
+
+    """
+
+    shear = np.ma.atleast_2d(shear)
+    no_shear = np.ma.getmaskarray(shear).all(axis=-1)
+
+    maximum = np.ma.masked_array(shear.max(axis=-1), mask=no_shear)
+    position = np.ma.masked_array(
+            np.asarray(x)[shear.argmax(axis=-1, fill_value=-np.inf)],
+            mask=no_shear
+            )
+
+    return maximum, position
+
+def read_shear(files, floor=0, num_rows=1, min_mass=0., columns=1,
+        prefetch=2):
+    """
+    Read the shear between row floor and the row num_rows above it for
+    all data map files, with 'droplet' cells as for DataMap.droplet with
+    options min_mass and columns.
+
+    Only the two rows are kept from every map and the shear is calculated
+    for the full stack of frames at once. Maps are read with prefetch
+    upcoming frames in the background, as by System.iter_frames. Returns
+    the masked shear array with frames along the first and columns along
+    the second index, and the x positions of columns.
+
+    """
+
+    ceil = floor + num_rows
+
+    rows = {'U': [], 'droplet': []}
+    x = None
+    dy = None
+
+    system = System(datamaps=list(files), min_mass=min_mass, columns=columns)
+    for _, arrays in system.iter_frames(['X', 'Y', 'U', 'droplet'], prefetch):
+        if x is None:
+            x = arrays['X'][0, :]
+            dy = arrays['Y'][1, 0] - arrays['Y'][0, 0]
+
+        rows['U'].append(arrays['U'][[floor, ceil], :])
+        rows['droplet'].append(arrays['droplet'][[floor, ceil], :])
+
+    if x is None:
+        return np.ma.masked_array(np.empty((0, 0))), np.empty(0)
+
+    shear = shear_rate(rows['U'], rows['droplet'], 0, 1, dy)
+
+    return shear, x
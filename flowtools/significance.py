@@ -0,0 +1,234 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Significance tests of differences between groups of aligned series.
+
+Groups are 2d arrays with runs along the first and times along the
+second index (as from ensemble.align), all tests are done for every
+time at once. NaN values are left out.
+
+Functions:
+    correct_pvalues - correct p-values for multiple comparisons
+    pairwise_tests - test all pairs of a set of groups
+    permutation_test - p-values of Welch's t from random permutations
+    welch_t - Welch's t-test for unequal variances
+
+"""
+
+import numpy as np
+
+def correct_pvalues(pvalues, method='holm', axis=None):
+    """
+    Correct p-values for multiple comparisons with the 'bonferroni',
+    'holm' (default) or 'fdr_bh' (Benjamini-Hochberg) method, or return
+    them as they are for 'none'. The family of comparisons is all values
+    along axis, or all values if axis is None.
+
+    """
+
+    pvalues = np.asarray(pvalues, dtype=float)
+    if method == 'none':
+        return pvalues.copy()
+
+    shape = pvalues.shape
+    if axis is None:
+        pvalues = pvalues.reshape(-1, 1)
+        axis = 0
+
+    pvalues = np.moveaxis(pvalues, axis, 0)
+    num = pvalues.shape[0]
+
+    if method == 'bonferroni':
+        corrected = pvalues*num
+
+    elif method in ('holm', 'fdr_bh'):
+        order = np.argsort(pvalues, axis=0)
+        ranked = np.take_along_axis(pvalues, order, axis=0)
+        rank = np.arange(1, num + 1).reshape((-1, ) + (1, )*(ranked.ndim - 1))
+
+        # Step down for Holm and step up for Benjamini-Hochberg
+        if method == 'holm':
+            ranked = np.maximum.accumulate(ranked*(num - rank + 1), axis=0)
+        else:
+            ranked = np.flip(ranked*num/rank, 0)
+            ranked = np.flip(np.minimum.accumulate(ranked, axis=0), 0)
+
+        corrected = np.empty_like(ranked)
+        np.put_along_axis(corrected, order, ranked, axis=0)
+
+    else:
+        raise KeyError("correction method must be one of 'none', "
+                "'bonferroni', 'holm' or 'fdr_bh'")
+
+    corrected = np.minimum(corrected, 1.)
+
+    return np.moveaxis(corrected, 0, axis).reshape(shape)
+
+def pairwise_tests(groups, permutations=None, seed=None, correction='none'):
+    """
+    Test the difference of means of all pairs of groups at every time
+    with Welch's t-test, or with permutation_test if a number of
+    permutations is given. P-values are corrected for the comparisons of
+    all pairs at every time with correct_pvalues using correction.
+
+    Returns a list of the index pairs (i, j) of groups and a 2d array
+    with p-values of the pairs along the first and times along the second
+    index, which is empty for fewer than two groups.
+
+    """
+
+    pairs = [(i, j) for i in range(len(groups))
+            for j in range(i + 1, len(groups))]
+
+    # No pairs with fewer than two groups
+    if not pairs:
+        num_times = np.atleast_2d(groups[0]).shape[1] if len(groups) else 0
+        return pairs, np.empty((0, num_times))
+
+    pvalues = []
+    for i, j in pairs:
+        if permutations:
+            _, p = permutation_test(groups[i], groups[j], permutations, seed)
+        else:
+            _, _, p = welch_t(groups[i], groups[j])
+        pvalues.append(p)
+
+    pvalues = np.array(pvalues).reshape(len(pairs), -1)
+    pvalues = correct_pvalues(pvalues, correction, axis=0)
+
+    return pairs, pvalues
+
+def permutation_test(first, second, num_permutations=10000, seed=None,
+        max_elements=2**22):
+    """
+    Test the difference of means of two groups at every time by randomly
+    permuting runs between the groups num_permutations times, with a
+    generator seeded with seed. Returns Welch's t of the groups and the
+    two-sided p-value of it, the fraction of permutations with at least
+    as large an absolute t.
+
+    Permutations are drawn in chunks as a matrix of group memberships of
+    runs, which gives the sums of all permuted groups as matrix products
+    with the pooled runs. Chunks hold at most max_elements statistics,
+    which bounds memory use.
+
+    """
+
+    first = np.atleast_2d(np.asarray(first, dtype=float))
+    second = np.atleast_2d(np.asarray(second, dtype=float))
+
+    pooled = np.concatenate([first, second], axis=0)
+    present = ~np.isnan(pooled)
+
+    # Center values on the pooled mean, which keeps sums of squares small
+    with np.errstate(invalid='ignore', divide='ignore'):
+        center = np.where(present, pooled, 0.).sum(axis=0)/present.sum(axis=0)
+    values = np.where(present, pooled - center, 0.)
+    squares = values**2
+
+    totals = [matrix.sum(axis=0) for matrix in (present, values, squares)]
+
+    def statistic(membership):
+        """Welch's t of groups given by rows of a membership matrix."""
+
+        inside = [membership @ matrix for matrix in (present, values, squares)]
+        outside = [total - part for total, part in zip(totals, inside)]
+
+        return _welch(*_moments(*inside), *_moments(*outside))[0]
+
+    observed = np.zeros((1, len(pooled)))
+    observed[0, :len(first)] = 1.
+    t = statistic(observed)[0]
+
+    rng = np.random.default_rng(seed)
+    exceed = np.zeros(pooled.shape[1])
+    chunksize = max(1, max_elements//max(1, pooled.shape[1]))
+
+    for start in range(0, num_permutations, chunksize):
+        num = min(chunksize, num_permutations - start)
+
+        # Random permutations of which runs make up the first group
+        ranks = rng.random((num, len(pooled))).argsort(axis=1)
+        membership = (ranks < len(first)).astype(float)
+
+        with np.errstate(invalid='ignore'):
+            exceed += (np.abs(statistic(membership)) >= np.abs(t)).sum(axis=0)
+
+    pvalue = (exceed + 1)/(num_permutations + 1)
+    pvalue[np.isnan(t)] = np.nan
+
+    return t, pvalue
+
+def welch_t(first, second):
+    """
+    Welch's t-test for the difference of means of two groups at every
+    time. Returns arrays of t, the degrees of freedom and the two-sided
+    p-value.
+
+    """
+
+    from scipy.special import stdtr
+
+    moments = []
+    for group in (first, second):
+        group = np.atleast_2d(np.asarray(group, dtype=float))
+        present = ~np.isnan(group)
+        num = present.sum(axis=0)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(present, group, 0.).sum(axis=0)/num
+            deviation = np.where(present, group - mean, 0.)
+            variance = (deviation**2).sum(axis=0)/(num - 1)
+
+        moments.extend([num, mean, variance])
+
+    t, dof = _welch(*moments)
+
+    with np.errstate(invalid='ignore'):
+        pvalue = 2*stdtr(dof, -np.abs(t))
+
+    return t, dof, pvalue
+
+def _moments(num, total, squares):
+    """
+    Return the number of values, mean and variance from the number of
+    values, their sum and sum of squares.
+
+    """
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total/num
+        variance = (squares - num*mean**2)/(num - 1)
+
+    return num, mean, variance
+
+def _welch(num_a, mean_a, var_a, num_b, mean_b, var_b):
+    """
+    Return Welch's t and degrees of freedom of two groups from their
+    number of values, means and variances.
+
+    """
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        error_a = var_a/num_a
+        error_b = var_b/num_b
+        error = error_a + error_b
+
+        t = (mean_a - mean_b)/np.sqrt(error)
+        dof = error**2/(error_a**2/(num_a - 1) + error_b**2/(num_b - 1))
+
+    return t, dof
@@ -25,14 +25,19 @@ Functions:
     get_labels - get labels for legend
     get_linestyles - get line styles for plot
     get_shift - find a time shift for a given synchronisation
+    read_spread - read a spread file through the process-wide cache
 
 """
 
+from flowtools.cache import LRUCache, file_key
 from flowtools.datamaps import Spread
-from pandas import DataFrame, Series
+from flowtools.ensemble import align, ensemble_stats, first_crossing, stack_series
 
 import numpy as np
 
+# Parsed spreads by (path, mtime, size), set max_bytes to change the budget
+spread_cache = LRUCache()
+
 def calc_radius(spread, error=False, diameter=False):
     """
     Calculate and return a dictionary containing spreading radius,
@@ -49,58 +54,40 @@ def calc_radius(spread, error=False, diameter=False):
             std_error[key] = np.array(spread.spread[key]['std'])**2
         return list(np.sqrt(std_error['right'] + std_error['left']))
 
-def combine_spread(file_set, shift, drop_return_data=False):
+def combine_spread(file_set, shift, drop_return_data=False,
+        interpolate=False):
     """
     Combine the spread of input files, return with mean and standard
     deviation calculated.
 
+    The spreads are aligned on a shared time axis with ensemble.align,
+    keeping only times present in all files unless there is a single file.
+    With interpolate, series are interpolated onto the shared axis
+    instead of requiring exactly matching times.
+
     """
 
-    data = []
-    values = {}
-    for val in ('left', 'right', 'com', 'dist', 'radius', 'diameter'):
-        values[val] = {}
-
-    # Collect data from all files into dictionaries
-    for i, _file in enumerate(file_set):
-        data.append(Spread().read(_file))
-        for val in values.keys():
-            values[val][i] = Series(
-                    data=data[i].spread[val]['val'],
-                    index=data[i].times
-                    )
-        data[i].times = (np.array(data[i].times) - shift[i])
+    data = [read_spread(_file) for _file in file_set]
+    times, values = align(data, shift, interpolate=interpolate)
+    stats = ensemble_stats(values)
 
     spread = Spread()
     spread.spread['num'] = len(file_set)
+    spread.times = times
 
-    for val in values.keys():
-
-        # Shift time as per synchronisation
-        for i in values[val]:
-            values[val][i].index = np.array(values[val][i].index) - shift[i]
-
-        # Convert to DataFrame
-        df = DataFrame(data=values[val])
-
-        # If not a single file, keep only indices with at least two non-NaN
-        if len(file_set) > 1:
-            df = df.dropna()
+    for val, stat in stats.items():
+        spread.spread[val]['val'] = stat['val']
+        spread.spread[val]['std'] = stat['std']
+        spread.spread[val]['std_error'] = stat['std_error']
 
-        # If return data dropped, fill data here
+    # Return data either on the shared time axis or shifted in full
+    for i, _ in enumerate(data):
         if drop_return_data:
-            for i in df.columns:
-                data[i].spread[val]['val'] = df[i].tolist()
-
-        # Get times, mean and standard error as lists
-        mean = list(df.mean(axis=1))
-        std_error = list(df.std(axis=1))
-        times = list(df.index)
-
-        # Add to Spread object
-        spread.spread[val]['val'] = mean
-        spread.spread[val]['std'] = std_error
-        spread.spread['times'] = times
+            data[i].times = times
+            for val in values.keys():
+                data[i].spread[val]['val'] = values[val][i]
+        else:
+            data[i].times = np.array(data[i].times) - shift[i]
 
     return spread, data
 
@@ -145,55 +132,63 @@ def get_linestyles(linestyles, num_lines, default='solid'):
     return linestyles
 
 def get_shift(spread_files_array, sync=None,
-        radius_array=None, radius_fraction=0.0):
+        radius_array=None, radius_fraction=0.0, interpolate=False):
     """
     Calculate the desired time shift for synchronisation, return as 2D array
     with time shift values corresponding to file name positions.
 
+    Shifts of all files are found at once with ensemble.first_crossing,
+    files which never reach the synchronisation point are shifted to
+    their closest approach to it. With interpolate the crossing time is
+    interpolated between frames.
+
     """
 
-    # If common center of mass for synchronisation desired, find minimum
-    if sync == 'com':
-        min_dist = np.inf
-        for file_set in spread_files_array:
-            for _file in file_set:
-                data = Spread().read(_file)
-                if data.dist[0] < min_dist:
-                    min_dist = data.dist[0]
-
-    # Find full shift array for chosen synchronisation type
-    full_shift = []
-    for i, file_set in enumerate(spread_files_array):
-        radius = radius_array[i]
-        full_shift.append([])
-
-        for _file in file_set:
-            data = Spread().read(_file)
-
-            if sync == 'impact':
-                shift = data.times[0]
-
-            elif sync == 'com':
-                j = 0
-                while data.dist[j] > min_dist:
-                    j += 1
-                shift = data.times[j]
-
-            elif sync == 'radius':
-                j = 0
-                while data.radius[j]/radius < radius_fraction:
-                    j += 1
-                shift = data.times[j]
-
-            else:
-                shift = 0.
-
-            full_shift[i].append(shift)
-
-    # Shift all lines to make the smallest shift impact at time zero
-    to_zero = min(min(full_shift))
-    #for i, shift_set in enumerate(full_shift):
-    #    for j, _ in enumerate(shift_set):
-    #        full_shift[i][j] -= to_zero
+    data = [read_spread(_file)
+            for file_set in spread_files_array for _file in file_set]
+    sizes = [len(file_set) for file_set in spread_files_array]
+    times = stack_series([spread.times for spread in data])
+
+    if sync == 'impact':
+        shift = times[:, 0]
+
+    # For common center of mass find the minimum height of all impacts
+    elif sync == 'com':
+        dist = stack_series([spread.dist for spread in data])
+        min_dist = np.nanmin(dist[:, 0])
+        shift = first_crossing(times, dist, min_dist, below=True,
+                interpolate=interpolate)
+
+    elif sync == 'radius':
+        if radius_array is None:
+            radius_array = np.ones(len(sizes))
+        scale = np.repeat(np.asarray(radius_array, dtype=float), sizes)
+        radius = stack_series([spread.radius for spread in data])
+        shift = first_crossing(times, radius/scale[:, np.newaxis],
+                radius_fraction, interpolate=interpolate)
+
+    else:
+        shift = np.zeros(len(data))
+
+    # Split into sets as of input files
+    full_shift = [shift_set.tolist() for shift_set
+            in np.split(shift, np.cumsum(sizes)[:-1])]
 
     return full_shift
+
+def read_spread(_path):
+    """
+    Read the spread of a file at _path, parsing it only if it is not in
+    spread_cache or has been modified since it was cached. A copy of the
+    cached spread is returned, which can be modified freely.
+
+    """
+
+    key = file_key(_path)
+
+    spread = spread_cache.get(key)
+    if spread == None:
+        spread = Spread().read(_path)
+        spread_cache.put(key, spread, spread.nbytes)
+
+    return spread.copy()
@@ -0,0 +1,196 @@
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Velocities of spreading series.
+
+All functions work along the last axis, so an ensemble of series which
+share times (as from ensemble.align) is handled at once as a 2d array.
+Series of different lengths can be handled at once by padding their
+values and times with NaN at the end (as by ensemble.stack_series), every
+series then ends at its last time.
+
+Functions:
+    finite_difference - velocity from differences over a number of frames
+    running_average - running average over a window of frames
+    savgol_derivative - velocity from a Savitzky-Golay filter
+
+"""
+
+import numpy as np
+
+def finite_difference(values, times, num_sample=1):
+    """
+    Calculate the velocity of values at every frame as the difference
+    between the frames num_sample before and after it, divided by the
+    time between them. At the ends of series the difference is taken to
+    the first or last frame.
+
+    """
+
+    values = np.asarray(values, dtype=float)
+    times = np.asarray(times, dtype=float)
+
+    num = values.shape[-1]
+    index = np.arange(num)
+    length = _lengths(times)
+
+    lower = np.maximum(0, index - num_sample)
+    upper = np.minimum(index + num_sample, length - 1)
+
+    if upper.ndim == 1:
+        difference = values[..., upper] - values[..., lower]
+        delta_t = times[..., upper] - times[..., lower]
+    else:
+        shape = np.broadcast_shapes(values.shape, upper.shape)
+        lower = np.broadcast_to(lower, shape)
+        upper = np.broadcast_to(upper, shape)
+        values = np.broadcast_to(values, shape)
+        times = np.broadcast_to(times, shape)
+
+        difference = (np.take_along_axis(values, upper, -1)
+                - np.take_along_axis(values, lower, -1))
+        delta_t = (np.take_along_axis(times, upper, -1)
+                - np.take_along_axis(times, lower, -1))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        velocity = np.where(index < length, difference/delta_t, np.nan)
+
+    return velocity
+
+def running_average(values, times, num_average, include='full'):
+    """
+    Calculate the running average of values over the num_average frames
+    on both sides of every frame, using cumulative sums. Returns the
+    averages and the times of the frames they were kept for.
+
+    With include 'full' (default) windows are cut at the ends of the
+    series, with 'equal' windows are shrunk to have an equal number of
+    frames on both sides and with 'limited' only frames with full windows
+    are kept. Frames with no neighbours in their window are not kept.
+    Values which are not finite are left out of the averages, windows
+    without any finite values average to NaN.
+
+    For series padded to different lengths, frames are kept if they are
+    in any series and the averages and times of other series are NaN.
+
+    """
+
+    values = np.asarray(values, dtype=float)
+    times = np.asarray(times, dtype=float)
+
+    num = values.shape[-1]
+    index = np.arange(num)
+    length = _lengths(times)
+
+    if include == 'equal':
+        width = np.minimum(index, length - 1 - index)
+        width = np.clip(width, 0, num_average)
+    else:
+        width = np.full(num, num_average)
+
+    lower = np.maximum(0, index - width)
+    upper = np.minimum(index + width, length - 1)
+
+    keep = (width > 0) & (index < length)
+    if include == 'limited':
+        keep &= (upper - lower) == 2*num_average
+
+    # Sums and counts of finite values only, so that a NaN or inf (as from
+    # frames sharing a time) is left out of the windows it is in
+    finite = np.isfinite(values)
+    zero = np.zeros(values.shape[:-1] + (1, ))
+    total = np.concatenate([zero,
+            np.cumsum(np.where(finite, values, 0.), axis=-1)], axis=-1)
+    count = np.concatenate([zero, np.cumsum(finite, axis=-1)], axis=-1)
+
+    if keep.ndim == 1:
+        lower, upper = lower[keep], upper[keep]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average = ((total[..., upper + 1] - total[..., lower])
+                    /(count[..., upper + 1] - count[..., lower]))
+
+        return average, times[..., keep]
+
+    # Times keep their own shape, without the leading axes of values
+    times = np.where(keep, times, np.nan)
+
+    shape = np.broadcast_shapes(values.shape, keep.shape)
+    lower = np.broadcast_to(lower, shape)
+    upper = np.broadcast_to(upper + 1, shape)
+    keep = np.broadcast_to(keep, shape)
+    total = np.broadcast_to(total, shape[:-1] + (num + 1, ))
+    count = np.broadcast_to(count, shape[:-1] + (num + 1, ))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average = ((np.take_along_axis(total, upper, -1)
+                - np.take_along_axis(total, lower, -1))
+                /(np.take_along_axis(count, upper, -1)
+                - np.take_along_axis(count, lower, -1)))
+
+    average = np.where(keep, average, np.nan)
+
+    # Frames which are kept in any series
+    columns = keep.reshape(-1, num).any(axis=0)
+
+    return average[..., columns], times[..., columns]
+
+def savgol_derivative(values, times, window, polyorder=2):
+    """
+    Calculate the velocity of values with a Savitzky-Golay filter of
+    odd window length and polynomial order polyorder. Times are assumed
+    to be equally spaced. Padded series are filtered together in groups
+    of equal length, which must all be at least window long.
+
+    """
+
+    from scipy.signal import savgol_filter
+
+    values = np.asarray(values, dtype=float)
+    times = np.asarray(times, dtype=float)
+    length = _lengths(times)
+
+    if length.ndim == 0:
+        delta = (times[..., -1] - times[..., 0])/(times.shape[-1] - 1)
+
+        return savgol_filter(values, window, polyorder, deriv=1,
+                delta=np.mean(delta), axis=-1)
+
+    # Series of the same length along the second to last axis are
+    # filtered at once
+    length = length.reshape(-1)
+    velocity = np.full(values.shape, np.nan)
+
+    for num in np.unique(length):
+        rows = length == num
+        delta = (times[rows, num - 1] - times[rows, 0])/(num - 1)
+        velocity[..., rows, :num] = savgol_filter(values[..., rows, :num],
+                window, polyorder, deriv=1, delta=np.mean(delta), axis=-1)
+
+    return velocity
+
+def _lengths(times):
+    """
+    Return the number of frames of series from their times, padded with
+    NaN at the end. This is a scalar for unpadded times, otherwise an
+    array of lengths with a trailing axis for broadcasting.
+
+    """
+
+    if times.ndim < 2 or not np.isnan(times[..., -1]).any():
+        return np.array(times.shape[-1])
+
+    return np.isfinite(times).sum(axis=-1, keepdims=True)
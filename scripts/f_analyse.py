@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Script for running several analyses of a system in a single pass over
+its data maps, writing the output of each to a file.
+
+Outputs are as from f_collect_spread, f_viscous_dissipation --output,
+f_shearmax --output and f_interface respectively. The time between
+frames (-dt) defaults to 1 for all analyses, so the spread is only as
+from f_collect_spread with its default of 0 if -dt 0 is given.
+
+"""
+
+import argparse
+import numpy as np
+
+from flowtools.datamaps import System
+from flowtools.pipeline import DissipationConsumer, InterfaceConsumer, \
+        ShearConsumer, SpreadConsumer
+
+parser = argparse.ArgumentParser(
+        description="Run several analyses of data maps in a single pass.")
+
+# Input base arguments
+input_args = parser.add_argument_group('input')
+input_args.add_argument('base', help="file name base of system")
+input_args.add_argument('-s', '--start', type=int, default=1,
+        help="initial frame number")
+input_args.add_argument('-e', '--end', type=int, default=np.inf,
+        help="final frame number")
+input_args.add_argument('-m', '--min_mass', type=float, default=0.,
+        metavar='MASS', help="minimum mass of droplet cells")
+input_args.add_argument('--floor', type=int, default=0,
+        help="floor row of the system for spreading, slip dissipation "
+        "and shear (default: 0)")
+input_args.add_argument('-dt', '--delta_t', type=float, default=1.,
+        help="time difference between frames (default: 1, as "
+        "f_viscous_dissipation and f_shearmax, where f_collect_spread "
+        "uses 0)")
+input_args.add_argument('-t0', '--time_start', type=float, default=0.,
+        metavar="T", help="time of initial frame (default: 0)")
+input_args.add_argument('--prefetch', type=int, default=2, metavar='N',
+        help="number of frames to read ahead in the background (default: 2)")
+
+# Analyses and their outputs
+output_args = parser.add_argument_group('analyses',
+        'analyses to run, each saving to a path')
+output_args.add_argument('--spread', metavar='PATH',
+        help="collect the spread of the droplet, binary if ending with .npz")
+output_args.add_argument('--dissipation', metavar='PATH',
+        help="calculate the viscous dissipation")
+output_args.add_argument('--shear', metavar='PATH',
+        help="calculate the shear above the floor, saved as .npz")
+output_args.add_argument('--interface', metavar='PATH',
+        help="calculate interface lengths, or contact angles with --angle")
+
+# Options of analyses
+dissipation_args = parser.add_argument_group('dissipation options')
+dissipation_args.add_argument('--viscosity', '-vv', type=float,
+        default=0.642e-3, help="viscosity in Pa*s (default: 0.642e-3)")
+dissipation_args.add_argument('--num_cells', '-N', type=int, default=1,
+        help="number of cells to take finite differences over (default: 1)")
+dissipation_args.add_argument('--width', '-w', type=float, default=1.,
+        help="width of the system in nm (default: 1)")
+dissipation_args.add_argument('--mass_flow', action='store_true',
+        help="use mass flow for finite differences")
+dissipation_args.add_argument('--slip', action='store_true',
+        help="calculate the dissipation due to slip at the floor")
+
+shear_args = parser.add_argument_group('shear options')
+shear_args.add_argument('--num_shear', type=int, default=1, metavar='N',
+        help="number of rows above the floor to take the shear over "
+        "(default: 1)")
+
+interface_args = parser.add_argument_group('interface options')
+interface_args.add_argument('-a', '--angle', action='store_true',
+        help="calculate contact angles instead of interface lengths")
+interface_args.add_argument('--angle_floor', type=int, default=0,
+        help="floor cell for contact angle calculation")
+interface_args.add_argument('--num_layers', type=int, default=1,
+        help="number of cells in height over which to calculate contact angles")
+interface_args.add_argument('--mean', action='store_true',
+        help="output the mean of left and right contact angles")
+
+# Parse
+args = parser.parse_args()
+
+if args.num_shear < 1:
+    parser.error('number of cell rows to calculate shear over (--num_shear) must be positive')
+
+# Frames are only read once, so are not kept in memory
+system = System(
+        base = args.base, delta_t = args.delta_t,
+        floor = args.floor, min_mass = args.min_mass, cache_bytes = 0
+        )
+system.files(start = args.start, end = args.end)
+
+if args.spread:
+    system.register(SpreadConsumer(args.spread, time_start=args.time_start))
+
+if args.dissipation:
+    system.register(DissipationConsumer(args.dissipation,
+            time_start = args.time_start,
+            floor = args.floor if args.slip else None,
+            N = args.num_cells, viscosity = args.viscosity,
+            width = args.width, delta_t = args.delta_t,
+            mass_flow = args.mass_flow
+            ))
+
+if args.shear:
+    system.register(ShearConsumer(args.shear, floor=args.floor,
+            num_rows=args.num_shear, delta_t=args.delta_t))
+
+if args.interface:
+    system.register(InterfaceConsumer(args.interface,
+            length = not args.angle, angle = args.angle,
+            floor = args.angle_floor, num_layers = args.num_layers,
+            mean = args.mean
+            ))
+
+if not system.consumers:
+    parser.error("no analysis chosen, supply at least one output path")
+
+system.run(prefetch=args.prefetch)
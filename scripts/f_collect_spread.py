@@ -32,7 +32,7 @@ parser = argparse.ArgumentParser()
 # Required arguments
 parser.add_argument('base', help="file name base of system")
 parser.add_argument('floor', type=int, help="floor row number of the system")
-parser.add_argument('save', help="file for saving spread data to")
+parser.add_argument('save', help="file for saving spread data to, binary if ending with .npz")
 
 # Optional arguments
 parser.add_argument('-dt', '--delta_t', type=float, default=0.,
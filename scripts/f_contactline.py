@@ -27,6 +27,7 @@ import os
 import sys
 
 from flowtools.datamaps import System, DataMap
+from flowtools.shear import frame_shear
 
 def contact_line_velocity(frames, delta_t):
     """
@@ -372,9 +373,13 @@ for frame, _file in enumerate(system.datamaps):
 
     datamap = DataMap(_file, min_mass = args.min_mass)
 
+    # Shear of the map is memoised, mark cells as DataMap._calc_cell_shear
     if args.type == 'shear':
-        datamap._calc_cell_shear(args.shear_numcells, mass_flow=False,
-                if_droplet=args.shear_remove_edges)
+        shear = frame_shear(_file, args.shear_numcells, min_mass=args.min_mass)
+        for cell, value in zip(datamap.cells.flat, shear.ravel().tolist()):
+            cell['shear'] = value
+            if args.shear_remove_edges and value == 0.:
+                cell['droplet'] = False
 
     interface = datamap.interface(get_cell_numbers=True)
     floor = interface[0][1]
@@ -24,118 +24,112 @@ Script for working with the interface of droplets.
 import argparse
 import numpy as np
 import os
-import pylab as plt
-
-from flowtools.datamaps import System, DataMap
-
-parser = argparse.ArgumentParser(
-        description="Draw graphs of the flow in data maps.")
-
-# Input base arguments
-input_args = parser.add_argument_group('input')
-input_args.add_argument('base', nargs='?', default=None,
-        help="file name base of system, combine with --start "
-            "and --end to work on range of maps using this base")
-input_args.add_argument('-s', '--start', type=int, default=1,
-        help="initial frame number")
-input_args.add_argument('-e', '--end', type=int, default=np.inf,
-        help="final frame number")
-input_args.add_argument('-f', '--file', help="specific file to work on")
-
-# Output arguments
-output_args = parser.add_argument_group('output modes')
-output_args.add_argument('-l', '--length', action='store_true',
-        help="output the interface length of maps")
-output_args.add_argument('-a', '--angle', action='store_true',
-        help="output the contact angles of maps")
-output_args.add_argument('--floor', type=int, default=0,
-        help="floor cell for contact angle calculation")
-output_args.add_argument('--num_layers', type=int, default=1,
-        help="number of cells in height over which to calculate contact angles")
-output_args.add_argument('--mean', action='store_true',
-        help="if outputting contact angles, output mean of left and right")
-output_args.add_argument('--noshow', action="store_false", dest='show',
-        help="do not display figures")
-output_args.add_argument('--save', default='', metavar='PATH',
-        help="save images to this file base, conserving frame numbers")
-output_args.add_argument('--dpi', default=150, type=int, help="output graph dpi")
-
-# Options
-draw_args = parser.add_argument_group('draw options',
-        'options detailing the output graph appearances')
-draw_args.add_argument('-m', '--min_mass', type=float, default=0.,
-        metavar='MASS', help="minimum mass of cell to include")
-draw_args.add_argument('--xmax', type=float, default=None, metavar='X')
-draw_args.add_argument('--xmin', type=float, default=None, metavar='X')
-draw_args.add_argument('--ymax', type=float, default=None, metavar='Y')
-draw_args.add_argument('--ymin', type=float, default=None, metavar='Y')
-draw_args.add_argument('--axis', default='scaled')
-
-# Decorations
-label_args = parser.add_argument_group('label options',
-        'pick labels for output figures')
-label_args.add_argument('--xlabel', default='Position (nm)')
-label_args.add_argument('--ylabel', default='Height (nm)')
-label_args.add_argument('--title', default='')
-
-# Parse
-args = parser.parse_args()
-
-if args.length and args.angle:
-    parser.error("will not output both contact angles (--angle) and interface lengths (--length)")
-
-xlims = [args.xmin, args.xmax]
-ylims = [args.ymin, args.ymax]
-
-# If base given, create system
-if args.base != None:
-    system = System(base = args.base)
-    system.files(start = args.start, end = args.end)
-
-else:
-    system = System()
-    system.datamaps = [args.file]
-
-for frame, _file in enumerate(system.datamaps):
-
-    # If saved figures desired construct filename
-    if args.save:
-        if args.base != None:
-            save = '%s%05d%s' % (args.save, frame + args.start, '.png')
-        else:
-            save = args.save
-    else:
-        save = ''
-
-    datamap = DataMap(_file, min_mass = args.min_mass)
-
-    datamap.draw_interface()
 
-    plt.axis(args.axis)
-    plt.xlim(xlims)
-    plt.ylim(ylims)
-    plt.xlabel(args.xlabel)
-    plt.ylabel(args.ylabel)
-    plt.title(args.title)
+from flowtools.datamaps import System
+from flowtools.render import InterfaceFrame, frame_filename, render
+
+def main():
+    """Draw the interfaces of droplets in data maps, printing their measures."""
+
+    parser = argparse.ArgumentParser(
+            description="Draw graphs of the flow in data maps.")
+
+    # Input base arguments
+    input_args = parser.add_argument_group('input')
+    input_args.add_argument('base', nargs='?', default=None,
+            help="file name base of system, combine with --start "
+                "and --end to work on range of maps using this base")
+    input_args.add_argument('-s', '--start', type=int, default=1,
+            help="initial frame number")
+    input_args.add_argument('-e', '--end', type=int, default=np.inf,
+            help="final frame number")
+    input_args.add_argument('-f', '--file', help="specific file to work on")
+
+    # Output arguments
+    output_args = parser.add_argument_group('output modes')
+    output_args.add_argument('-l', '--length', action='store_true',
+            help="output the interface length of maps")
+    output_args.add_argument('-a', '--angle', action='store_true',
+            help="output the contact angles of maps")
+    output_args.add_argument('--floor', type=int, default=0,
+            help="floor cell for contact angle calculation")
+    output_args.add_argument('--num_layers', type=int, default=1,
+            help="number of cells in height over which to calculate contact angles")
+    output_args.add_argument('--mean', action='store_true',
+            help="if outputting contact angles, output mean of left and right")
+    output_args.add_argument('--noshow', action="store_false", dest='show',
+            help="do not display figures")
+    output_args.add_argument('--save', default='', metavar='PATH',
+            help="save images to this file base, conserving frame numbers")
+    output_args.add_argument('--dpi', default=150, type=int, help="output graph dpi")
+    output_args.add_argument('--processes', '-j', type=int, default=1, metavar='N',
+            help="draw frames in this many headless processes, "
+            "requires --noshow (default: 1)")
+
+    # Options
+    draw_args = parser.add_argument_group('draw options',
+            'options detailing the output graph appearances')
+    draw_args.add_argument('-m', '--min_mass', type=float, default=0.,
+            metavar='MASS', help="minimum mass of cell to include")
+    draw_args.add_argument('--xmax', type=float, default=None, metavar='X')
+    draw_args.add_argument('--xmin', type=float, default=None, metavar='X')
+    draw_args.add_argument('--ymax', type=float, default=None, metavar='Y')
+    draw_args.add_argument('--ymin', type=float, default=None, metavar='Y')
+    draw_args.add_argument('--axis', default='scaled')
+
+    # Decorations
+    label_args = parser.add_argument_group('label options',
+            'pick labels for output figures')
+    label_args.add_argument('--xlabel', default='Position (nm)')
+    label_args.add_argument('--ylabel', default='Height (nm)')
+    label_args.add_argument('--title', default='')
+
+    # Parse
+    args = parser.parse_args()
+
+    if args.length and args.angle:
+        parser.error("will not output both contact angles (--angle) and interface lengths (--length)")
+
+    xlims = [args.xmin, args.xmax]
+    ylims = [args.ymin, args.ymax]
+
+    # If base given, create system
+    if args.base != None:
+        system = System(base = args.base)
+        system.files(start = args.start, end = args.end)
 
-    if args.length:
-        print(datamap._interface_length())
-
-    if args.angle:
-        try:
-            ca = datamap.contactangle(args.num_layers, args.floor)
-        except Exception:
-            ca = [0, 0]
-
-        if not args.mean:
-            print(ca[0], ca[1])
+    else:
+        system = System()
+        system.datamaps = [args.file]
+
+    if args.processes != 1 and args.show:
+        parser.error("drawing in parallel (--processes) requires --noshow")
+
+    renderer = InterfaceFrame(
+            min_mass = args.min_mass,
+            length = args.length, angle = args.angle,
+            floor = args.floor, num_layers = args.num_layers, mean = args.mean,
+            axis = args.axis, xlim = xlims, ylim = ylims,
+            xlabel = args.xlabel, ylabel = args.ylabel, title = args.title,
+            dpi = args.dpi, show = args.show
+            )
+
+    # If saved figures desired construct filenames
+    saves = []
+    for frame, _ in enumerate(system.datamaps):
+        if args.save:
+            if args.base != None:
+                saves.append(frame_filename(args.save, frame + args.start))
+            else:
+                saves.append(args.save)
         else:
-            print(np.mean(ca))
+            saves.append('')
 
-    if args.show:
-        plt.show()
+    for output in render(renderer, system.datamaps, saves, args.processes):
+        if output:
+            print(*output)
 
-    if args.save != '':
-        plt.savefig(save, dpi=args.dpi)
+    return None
 
-    plt.clf()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+# Flowtools - a suite of tools for handling and drawing flow data
+# Copyright (C) 2013 Petter Johansson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Script for saving coarse grained levels of data maps, for quickly reading
+and drawing them at lower resolution.
+
+"""
+
+import argparse
+import numpy as np
+import sys
+
+from flowtools.datamaps import System, save_pyramid
+
+parser = argparse.ArgumentParser(
+        description="Save coarse grained levels of data maps, combining 2, 4, 8, ... "
+        "cells along each axis. Levels are saved next to the maps as "
+        "'<map>.x<level><ext>' and can be read as any other data map.")
+
+# Input base arguments
+parser.add_argument('base', help="file name base of system")
+parser.add_argument('-s', '--start', type=int, default=1,
+        help="initial frame number")
+parser.add_argument('-e', '--end', type=int, default=np.inf,
+        help="final frame number")
+parser.add_argument('-n', '--levels', type=int, default=3,
+        help="number of levels to save (default: 3, for 2, 4 and 8 cells)")
+parser.add_argument('--quiet', '-q', action='store_true', help="talk less")
+
+args = parser.parse_args()
+
+system = System(base = args.base)
+system.files(start = args.start, end = args.end)
+
+for frame, _file in enumerate(system.datamaps):
+    if not args.quiet:
+        print("\rSaving levels of %s (%d of %d) ... "
+                % (_file, frame+1, len(system.datamaps)), end='')
+        sys.stdout.flush()
+
+    save_pyramid(_file, args.levels)
+
+if not args.quiet:
+    print("Done!")
@@ -25,12 +25,10 @@ import argparse
 import numpy as np
 import os
 import pylab as plt
-import sys
 
-from flowtools.datamaps import System, DataMap
-from flowtools.draw import plot_line
+from flowtools.datamaps import System
+from flowtools.shear import max_shear, read_shear
 from flowtools.utils import get_colours, get_labels, get_linestyles
-from scipy import optimize
 
 parser = argparse.ArgumentParser(
         description="Calculate the maximum shear rate of a datamap.")
@@ -55,7 +53,10 @@ input_args.add_argument('--noshow', dest="show", action="store_false",
         help="do not draw plot of shear per map")
 input_args.add_argument('--print', action="store_true", help="print profile to stdout")
 input_args.add_argument('--all', action="store_true",
-        help="draw or print all shear values along an axis, not just max")
+        help="draw or save all shear values along an axis, not just max")
+input_args.add_argument('--output', '-o', default='', metavar='PATH',
+        help="save shear of all columns and frames to this array file (.npz) "
+        "with fields 'times', 'x' and 'shear' (NaN outside of droplet)")
 
 # Options
 draw_args = parser.add_argument_group('draw options',
@@ -93,68 +94,53 @@ labels, draw_legend = get_labels(args.label, 2)
 system = System()
 system.files(base=args.datamap, start=args.begin, end=args.end)
 
-# Collect shear data in list
-frames = []
-max_shear = []
-
 floor = args.floor
 ceil = floor + args.num_shear
 if ceil <= floor:
     parser.error('number of cell rows to calculate shear over (--number) must be positive')
 
-rows = [floor, ceil]
-
-for i, _file in enumerate(system.datamaps):
-    print("Reading %s (%d of %d) ... " % (_file, i+1, len(system.datamaps)), end='')
-    sys.stdout.flush()
-    datamap = DataMap(_file, min_mass=args.min_mass)
-    print("Done!")
-
-    dy = datamap.info['cells']['size']['Y']
-    shear = []
-    xarray = []
-
-    for col in range(datamap.info['cells']['num_cells']['X']):
-        U = [0., 0.]
-        try:
-            for j, row in enumerate(rows):
-                if not datamap.cells[row][col]['droplet']:
-                    raise Exception
-                U[j] = datamap.cells[row][col]['U']
-
-            shear.append(abs(U[1] - U[0])/dy)
-            xarray.append(datamap.cells[0][col]['X'])
-        except Exception:
-            next
-
-    if shear != []:
-        frames.append((i+args.begin)*args.delta_t)
-        max_shear.append(max(shear))
-
-    if args.all:
-        if args.print:
-            for x, val in zip(xarray, shear):
-                print("%g %g" % (x, val))
-
-        if args.show:
-            plt.plot(xarray, shear, color=colours[0], linestyle=linestyles[0], label=labels[0])
-            plt.show()
-            plt.clf()
-            plt.xlabel(args.xlabel)
-            plt.ylabel(args.ylabel)
-            plt.title(args.title)
+# Calculate shear of all frames at once
+shear, xarray = read_shear(system.datamaps, floor=floor,
+        num_rows=args.num_shear, min_mass=args.min_mass)
+times = (np.arange(len(system.datamaps)) + args.begin)*args.delta_t
+
+if args.output:
+    np.savez(args.output, times=times, x=xarray, shear=shear.filled(np.nan))
+
+# Keep only frames with shear
+maximum, _ = max_shear(shear, xarray)
+has_shear = ~np.ma.getmaskarray(maximum)
+frames = times[has_shear]
+maxima = maximum.compressed()
+
+# Print shear of all columns with droplet cells in both rows per frame
+if args.all and args.print:
+    for frame_shear in shear:
+        has_droplet = ~np.ma.getmaskarray(frame_shear)
+        for x, val in zip(xarray[has_droplet], frame_shear.compressed()):
+            print("%g %g" % (x, val))
+
+if args.all and args.show:
+    for frame_shear in shear:
+        plt.plot(xarray[~np.ma.getmaskarray(frame_shear)], frame_shear.compressed(),
+                color=colours[0], linestyle=linestyles[0], label=labels[0])
+        plt.xlabel(args.xlabel)
+        plt.ylabel(args.ylabel)
+        plt.title(args.title)
+        plt.show()
+        plt.clf()
 
 # Get some plot options
 plt.xlabel(args.xlabel)
 plt.ylabel(args.ylabel)
 plt.title(args.title)
-plt.plot(frames, max_shear, color=colours[0], linestyle=linestyles[0], label=labels[0])
+plt.plot(frames, maxima, color=colours[0], linestyle=linestyles[0], label=labels[0])
 
 # Print profile if wanted
 if args.print and not args.all:
     print()
-    for t, shear in zip(frames, max_shear):
-        print("%g %g" % (t, shear))
+    for t, val in zip(frames, maxima):
+        print("%g %g" % (t, val))
 
 # Save if desired
 if args.save:
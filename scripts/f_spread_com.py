@@ -20,8 +20,10 @@ import argparse
 import numpy as np
 import pylab as plt
 
+from flowtools.bootstrap import bootstrap_ci
 from flowtools.draw import plot_line
 from flowtools.datamaps import Spread
+from flowtools.ensemble import align
 from flowtools.utils import combine_spread, get_colours, get_labels, get_linestyles, get_shift
 
 def com_plot(args):
@@ -60,7 +62,15 @@ def com_plot(args):
             plot_line(line=line, domain=domain, color=colours[i],
                     label=labels[i], linestyle=linestyles['line'][i])
 
-        if error:
+        if error and args.bootstrap:
+            domain, values = align(data, fields=['dist'])
+            interval = bootstrap_ci(values['dist'], args.bootstrap,
+                    args.confidence, args.seed, args.processes)
+            for line in (interval['lower'], interval['upper']):
+                plot_line(line=line, domain=domain, color=colours[i],
+                        linestyle=linestyles['error'][i])
+
+        elif error:
             domain = spread.times
             line = list(np.array(spread.dist)
                     + np.array(spread.spread['dist']['std_error'])
@@ -138,6 +148,15 @@ if __name__ == '__main__':
     error.add_argument('--sigma', type=float, default=1.,
             help="number of standard deviations from mean, or Z-score, "
                     "for error lines (default: 1)")
+    error.add_argument('--bootstrap', type=int, default=None, metavar='N',
+            help="draw bootstrap confidence intervals of the mean from N "
+                    "resamples of the files instead of standard errors")
+    error.add_argument('--confidence', type=float, default=0.95,
+            help="confidence level of bootstrap intervals (default: 0.95)")
+    error.add_argument('--seed', type=int, default=None,
+            help="seed for bootstrap resampling, for reproducible intervals")
+    error.add_argument('-j', '--processes', type=int, default=1, metavar='N',
+            help="number of processes for bootstrap resampling (default: 1)")
 
     # Decoration options
     decoration = parser.add_argument_group(title="Graph decoration",
@@ -20,10 +20,9 @@ import argparse
 import numpy as np
 import pylab as plt
 
-from flowtools.datamaps import Spread
 from flowtools.draw import plot_line
-from flowtools.utils import calc_radius, combine_spread, get_colours, get_labels, get_linestyles, get_shift
-from scipy import optimize
+from flowtools.ensemble import fit_power_law, stack_series
+from flowtools.utils import calc_radius, combine_spread, get_colours, get_labels, get_linestyles, get_shift, read_spread
 
 def spread_plot(args):
     """Draw the spreading as a function of time."""
@@ -37,10 +36,6 @@ def spread_plot(args):
     linestyles['fit'] = get_linestyles(args.fitstyle, len(args.spreading),
             'dashed')
 
-    # Create linear fitting function
-    fitfunc = lambda p, t, r: r - p[0] - p[1] * t
-    pinit = [1.0, 1/7]
-
     # Find shift array for synchronisation
     shift_array = get_shift(args.spreading, sync=args.sync)
     impact_shift = get_shift(args.spreading, sync='impact')
@@ -65,42 +60,28 @@ def spread_plot(args):
         spread, full_data = combine_spread(spread_list, shift=shift_array[i])
         spread.times = np.array(spread.times) - spread.times[0]
 
-        for k, _file in enumerate(spread_list):
-            data = Spread().read(_file)
-            data.times = np.array(data.times) - impact_shift[i][k]
-
-            # Get radius and domain
-            radius = {'real': np.array(calc_radius(data))}
-            domain = {'real': np.array(data.times)}
-
-            # Cut times outside of range
-            for j, time in enumerate(domain['real']):
-                if time > args.tend:
-                    radius['real'] = radius['real'][:j]
-                    domain['real'] = domain['real'][:j]
-
-            # Add logged values
-            radius['log'] = np.log10(radius['real'][1:])
-            domain['log'] = np.log10(domain['real'][1:])
+        # Fit all files of the set at once
+        data = [read_spread(_file) for _file in spread_list]
+        times = stack_series([np.array(spread_data.times) - impact_shift[i][k]
+                for k, spread_data in enumerate(data)])
+        radii = stack_series([calc_radius(spread_data) for spread_data in data])
 
-            # Cut in log range
-            for j, logt in enumerate(domain['log']):
-                if logt > args.tendlog:
-                    radius['log'] = radius['log'][:j]
-                    domain['log'] = domain['log'][:j]
+        fit = fit_power_law(times, radii, args.tend, args.tendlog)
 
-            # Fit constants to data
-            out = optimize.leastsq(fitfunc, pinit,
-                    args=(domain['log'], radius['log']), full_output=1)
+        amp[i] = fit['amp'].tolist()
+        index[i] = fit['index'].tolist()
+        ampError[i] = fit['amp_error'].tolist()
+        indexError[i] = fit['index_error'].tolist()
 
-            pfinal = out[0]
-            covar = out[1]
+        for k, _ in enumerate(data):
+            # Get radius and domain inside fitting ranges
+            inside = np.cumprod(times[k] <= args.tend).astype(bool)
+            radius = {'real': radii[k][inside]}
+            domain = {'real': times[k][inside]}
 
-            # Add unlogged constants to lists
-            amp[i].append(10**pfinal[0])
-            index[i].append(pfinal[1])
-            ampError[i].append(np.sqrt(covar[1][1]) * amp[i][-1])
-            indexError[i].append(np.sqrt(covar[0][0]))
+            window = fit['window'][k]
+            radius['log'] = np.log10(radii[k][1:][window])
+            domain['log'] = np.log10(times[k][1:][window])
 
             if args.draw == 'log' and args.nomean:
                 plot_line(
@@ -111,7 +92,8 @@ def spread_plot(args):
                     )
                 if not args.nofit:
                     plot_line(
-                            line=out[0][0] + out[0][1] * domain['log'],
+                            line=(np.log10(amp[i][k])
+                                    + index[i][k] * domain['log']),
                             domain=domain['log'],
                             color=colours[i], linestyle=linestyles['fit'][i]
                             )
@@ -123,7 +105,7 @@ def spread_plot(args):
                         )
                 if not args.nofit:
                     plot_line(
-                            line=amp[i][-1] * (domain['real']**index[i][-1]),
+                            line=amp[i][k] * (domain['real']**index[i][k]),
                             domain=domain['real'],
                             color=colours[i], linestyle=linestyles['fit'][i]
                             )
@@ -22,8 +22,10 @@ import pylab as plt
 import os
 import shutil
 
+from flowtools.bootstrap import bootstrap_ci
 from flowtools.datamaps import Spread
 from flowtools.draw import plot_line
+from flowtools.ensemble import align
 from flowtools.utils import calc_radius, combine_spread, get_colours, get_labels, get_linestyles, get_shift
 
 def spread_plot(args):
@@ -140,7 +142,7 @@ def spread_plot(args):
 
         return None
 
-    def plot_error(spread):
+    def plot_error(spread, data):
         """Plot the error of either the edges or radius of a line."""
 
         def draw_error_line(spread):
@@ -168,6 +170,26 @@ def spread_plot(args):
 
             return None
 
+        def draw_bootstrap_lines(data):
+            times, values = align(data, fields=plot_type)
+            interval = bootstrap_ci(values, args.bootstrap, args.confidence,
+                    args.seed, args.processes)
+
+            for _type in plot_type:
+                for limit in ('lower', 'upper'):
+                    plot_line(
+                            line=interval[_type][limit],
+                            domain=times,
+                            color=colours[i],
+                            linestyle=linestyles['error'][i]
+                        )
+
+            return None
+
+        if args.bootstrap:
+            draw_bootstrap_lines(data)
+            return None
+
         for _type in plot_type:
             draw_error_line(spread)
 
@@ -249,7 +271,7 @@ def spread_plot(args):
 
         # If error for line is desired, calculate and plot
         if args.error:
-            plot_error(spread)
+            plot_error(spread, data)
 
         # Add set of xvg data to array
         if args.xvg:
@@ -365,6 +387,15 @@ if __name__ == '__main__':
     error.add_argument('--sigma', '-z', type=float, default=1.96, metavar='Z',
             help="number of standard errors from mean, or Z-score, "
                     "for error lines (default: 1.96, giving a 95%% CI)")
+    error.add_argument('--bootstrap', type=int, default=None, metavar='N',
+            help="draw bootstrap confidence intervals of the mean from N "
+                    "resamples of the files instead of standard errors")
+    error.add_argument('--confidence', type=float, default=0.95,
+            help="confidence level of bootstrap intervals (default: 0.95)")
+    error.add_argument('--seed', type=int, default=None,
+            help="seed for bootstrap resampling, for reproducible intervals")
+    error.add_argument('-j', '--processes', type=int, default=1, metavar='N',
+            help="number of processes for bootstrap resampling (default: 1)")
 
     # Decoration options
     decoration = parser.add_argument_group(title="Graph decoration",
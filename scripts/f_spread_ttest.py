@@ -21,67 +21,60 @@ import numpy as np
 import pylab as plt
 
 from flowtools.draw import plot_line
-from flowtools.datamaps import Spread
-from flowtools.utils import calc_radius, combine_spread, get_colours, get_labels, get_linestyles, get_shift
-from pandas import DataFrame, Series
-from scipy import stats
+from flowtools.ensemble import align
+from flowtools.significance import pairwise_tests
+from flowtools.utils import get_colours, get_labels, get_linestyles, get_shift, read_spread
 
 def t_test_plot(args):
-    """Perform a Welch's t-test on two sets of spread data, plot probability."""
-
-    def plot(spreading, _type, shift_array):
-        def get_line(spread, _type):
-            if _type == 'left' or _type == 'right':
-                return spread.spread[_type]['val']
-            elif _type == 'radius':
-                return calc_radius(spread)
-
-        data = {}
-        n = 0
-        for i, spread_list in enumerate(spreading):
-            for j, _file in enumerate(spread_list):
-                spread = Spread().read(_file)
-                line = get_line(spread, _type)
-                times = np.array(spread.times) - shift_array[i][j]
-                data[n] = Series(data=line, index=times)
-                n += 1
-
-        # Create DataFrame for all values and drop nan
-        df = DataFrame(data).dropna()
-        domain = df.index
-
-        n = 0
-        data = [[], []]
-        for i, spread_list in enumerate(spreading):
-            for j, _ in enumerate(spread_list):
-                data[i].append(df[n].tolist())
-                n += 1
-        t, p = stats.ttest_ind(data[0], data[1], equal_var=False)
-        plot_line(line=p, domain=domain, label=label[0], color=colour[0],
-                linestyle=linestyle['line'][0], hold=True)
+    """
+    Test the difference of means of all pairs of sets of spread data
+    at every time, plot probability.
+
+    """
+
+    def plot(groups, domain):
+        pairs, pvalues = pairwise_tests(groups, args.permutations, args.seed,
+                args.correction)
+
+        for k, p in enumerate(pvalues):
+            plot_line(line=p, domain=domain, label=label[k], color=colour[k],
+                    linestyle=linestyle['line'][k])
 
         return None
 
-    # Two sets of data must be given
-    if len(args.spreading) != 2:
-        parser.error("exactly two sets of spread data must be supplied with -f "
-                "(%d given)" % len(args.spreading))
+    # At least two sets of data must be given
+    if len(args.spreading) < 2:
+        parser.error("at least two sets of spread data must be supplied with "
+                "-f (%d given)" % len(args.spreading))
+
+    # Every pair of sets is tested and drawn as a line
+    num_pairs = len(args.spreading)*(len(args.spreading) - 1)//2
 
     # Get colours, labels and line styles from default
-    colour = get_colours(args.colour, len(args.spreading))
-    label, draw_legend = get_labels(args.label, len(args.spreading))
+    colour = get_colours(args.colour, num_pairs)
+    label, draw_legend = get_labels(args.label, num_pairs)
 
     linestyle = {}
-    linestyle['line'] = get_linestyles(args.linestyle, 2)
+    linestyle['line'] = get_linestyles(args.linestyle, num_pairs)
 
     # Find shift array for synchronisation
     shift_array = get_shift(args.spreading, sync=args.sync)
 
+    # Align all files on times present in every one, then split into sets
+    data = [read_spread(_file)
+            for spread_list in args.spreading for _file in spread_list]
+    shift = [delta for shift_set in shift_array for delta in shift_set]
+    domain, values = align(data, shift, fields=['left', 'right'])
+
+    split = np.cumsum([len(spread_list)
+            for spread_list in args.spreading])[:-1]
+
     if args.radius:
-        plot(args.spreading, 'radius', shift_array)
+        radius = (values['right'] - values['left'])/2
+        plot(np.split(radius, split), domain)
     else:
-        plot(args.spreading, 'left', shift_array)
-        plot(args.spreading, 'right', shift_array)
+        plot(np.split(values['left'], split), domain)
+        plot(np.split(values['right'], split), domain)
 
     plt.axis('normal')
 
@@ -129,6 +122,19 @@ if __name__ == '__main__':
     line.add_argument('--radius', action='store_true',
             help="perform the test on the total radius instead of edges")
 
+    # Test options
+    test = parser.add_argument_group(title="Test",
+            description="options for the significance test")
+    test.add_argument('--permutations', type=int, default=None, metavar='N',
+            help="compute p-values from N random permutations of runs "
+            "between sets instead of Welch's t-distribution")
+    test.add_argument('--seed', type=int, default=None,
+            help="seed for permutations, for reproducible p-values")
+    test.add_argument('--correction', default='none',
+            choices=['none', 'bonferroni', 'holm', 'fdr_bh'],
+            help="correct p-values for the comparisons of all pairs of sets "
+            "(default: none)")
+
     # Decoration options
     decoration = parser.add_argument_group(title="Graph decoration",
             description="options for decorating the graph")
@@ -22,7 +22,9 @@ import pylab as plt
 
 from flowtools.datamaps import Spread
 from flowtools.draw import plot_line
+from flowtools.ensemble import stack_series
 from flowtools.utils import calc_radius, combine_spread, get_colours, get_labels, get_linestyles, get_shift
+from flowtools.velocity import finite_difference, running_average, savgol_derivative
 
 def vel_plot(args):
     """Draw the spreading as a function of time."""
@@ -41,48 +43,32 @@ def vel_plot(args):
 
         return None
 
-    def calc_velocity(spread, plot_type, N, N_sample):
+    def calc_velocity(spreads, plot_type, N, N_sample):
         """
-        Returns the velocity of the spreading curve, as a running average
-        over N frames.
+        Returns the velocity of the spreading curves of a list of spreads,
+        as running averages over N frames. Series are padded to the same
+        length and calculated in one go, velocities have runs along the
+        first index as do the returned times.
 
         """
 
-        def get_velocity(spreading, times, N_sample):
-            velocity = []
-            for i, _ in enumerate(spreading):
-                i_min = max(0, i-N_sample)
-                i_max = min(i+N_sample, len(spreading)-1)
-                delta_x = spreading[i_max] - spreading[i_min]
-                delta_t = times[i_max] - times[i_min]
-                velocity.append(delta_x/delta_t)
+        times = stack_series([spread.times for spread in spreads])
+        values = np.array([
+                stack_series([spread.spread[_type]['val'] for spread in spreads])
+                for _type in plot_type
+                ])
 
-            return velocity
-
-        def calc_running_avg(velocity, full_times, N):
-            N0 = N
-            running_avg = {'val': [], 'std': []}
-            times = []
-
-            for i, _ in enumerate(velocity):
-                if args.include == 'equal':
-                    N = min(i - max(0, i-N0), min(i+N0, len(velocity)-1)-i)
-
-                i_min = max(0, i-N)
-                i_max = min(i+N, len(velocity)-1)
-
-                if N == 0 or (args.include == 'limited' and i_max - i_min != 2*N):
-                    continue
-
-                running_avg['val'].append(np.average(velocity[i_min:i_max+1]))
-                times.append(full_times[i])
+        if args.savgol:
+            velocity = savgol_derivative(values, times, args.savgol,
+                    args.polyorder)
+        else:
+            velocity = finite_difference(values, times, N_sample)
 
-            return running_avg, times
+        average, times = running_average(velocity, times, N, args.include)
 
         running_avg = {}
-        for _type in plot_type:
-            velocity = get_velocity(spread.spread[_type]['val'], spread.times, N_sample)
-            running_avg[_type], times = calc_running_avg(velocity, spread.times, N)
+        for j, _type in enumerate(plot_type):
+            running_avg[_type] = {'val': average[j], 'std': []}
 
         return running_avg, times
 
@@ -119,17 +105,21 @@ def vel_plot(args):
         # If --nomean, draw lines here
         label = labels[i]
         if args.nomean:
-            for spread_data in data:
-                vel, times = calc_velocity(spread_data, args.plot_type,
-                        args.num_average, args.num_sample)
-                plot_data(vel, times)
+            vel, times = calc_velocity(data, args.plot_type,
+                    args.num_average, args.num_sample)
+
+            for k, run_times in enumerate(times):
+                kept = ~np.isnan(run_times)
+                plot_data({_type: {'val': vel[_type]['val'][k][kept]}
+                        for _type in args.plot_type}, run_times[kept])
                 label = '_nolegend_'
 
         # Else draw the mean result
         else:
-            vel, times = calc_velocity(spread, args.plot_type,
+            vel, times = calc_velocity([spread], args.plot_type,
                     args.num_average, args.num_sample)
-            plot_data(vel, times)
+            plot_data({_type: {'val': vel[_type]['val'][0]}
+                    for _type in args.plot_type}, times[0])
 
     plt.title(args.title, fontsize='medium')
     plt.xlabel(args.xlabel, fontsize='medium')
@@ -155,15 +145,35 @@ def vel_plot(args):
                 )
 
     if args.print:
-        if args.nomean:
-            vel = calc_velocity(spread, args.plot_type, args.num_average, args.num_sample)
-        print_vel(vel, spread.times)
+        vel, times = calc_velocity([spread], args.plot_type,
+                args.num_average, args.num_sample)
+        print_vel({_type: {'val': vel[_type]['val'][0]}
+                for _type in args.plot_type}, times[0])
 
     if args.show:
         plt.show()
 
     return None
 
+def min_series_length(args):
+    """
+    Return the number of frames of the shortest series that velocities
+    are calculated for, the runs with --nomean and otherwise the means.
+
+    """
+
+    shift_array = get_shift(args.spreading, sync=args.sync)
+
+    lengths = []
+    for spread_list, shift in zip(args.spreading, shift_array):
+        spread, data = combine_spread(spread_list, shift=shift)
+        if args.nomean:
+            lengths.extend(len(spread_data.times) for spread_data in data)
+        else:
+            lengths.append(len(spread.times))
+
+    return min(lengths, default=0)
+
 if __name__ == '__main__':
     # Initiate subparsers for operations
     parser = argparse.ArgumentParser()
@@ -182,6 +192,11 @@ if __name__ == '__main__':
     line.add_argument('--dpi', type=int, default=150,
             help="DPI of output image")
 
+    line.add_argument('--savgol', type=int, default=None, metavar='N',
+            help="calculate velocities with a Savitzky-Golay filter over "
+            "an odd number N of frames instead of finite differences")
+    line.add_argument('--polyorder', type=int, default=2,
+            help="polynomial order of the Savitzky-Golay filter (default: 2)")
     line.add_argument('--include', choices = ['full', 'equal', 'limited'],
             help=("for the rolling mean, either keep calculations for all "
                 "samples (full), samples with an average from an equal number "
@@ -244,4 +259,15 @@ if __name__ == '__main__':
     else:
         args.plot_type = [args.plot_type]
 
+    if args.savgol != None:
+        if args.savgol % 2 == 0 or args.savgol <= args.polyorder:
+            parser.error("window of the Savitzky-Golay filter (--savgol) "
+                    "must be odd and larger than --polyorder")
+
+        num_frames = min_series_length(args)
+        if args.savgol > num_frames:
+            parser.error("window of the Savitzky-Golay filter (--savgol) "
+                    "is longer than the shortest series (%d frames)"
+                    % num_frames)
+
     vel_plot(args)
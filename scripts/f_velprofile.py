@@ -26,10 +26,9 @@ import numpy as np
 import os
 import pylab as plt
 
-from flowtools.datamaps import System, DataMap
-from flowtools.draw import plot_line
+from flowtools.datamaps import System
+from flowtools.profiles import combine_profiles, fit_linear, profile, read_stack
 from flowtools.utils import get_colours, get_labels, get_linestyles
-from scipy import optimize
 
 parser = argparse.ArgumentParser(
         description="Draw graphs of the flow in data maps.")
@@ -92,48 +91,22 @@ elif args.num_combine >= 1:
 else:
     parser.error('negative -n supplied')
 
-# Collect profile data into 2D arrays
-profile = {'data': [], 'count': [], 'std': [], 'error': []}
-
-for i, _file in enumerate(system.datamaps):
-    datamap = DataMap(_file, min_mass=args.min_mass)
-    height = {'data': []}
-
-    for _type in profile.keys():
-        profile[_type].append([])
-
-    for row in datamap.cells:
-        count = 0
-        flow = []
-        y = row[0]['Y']
-        height['data'].append(y)
-
-        for cell in row:
-            if cell['M'] > args.min_mass:
-                flow.append(cell['U'])
-                count += 1
-            else:
-                flow.append(0.)
-
-        profile['data'][i].append(np.array(flow).mean())
-        profile['count'][i].append(count)
-        profile['std'][i].append(np.array(flow).std())
-        profile['error'][i].append(np.array(flow).std()/(np.sqrt(count)))
+# Collect profile data of all maps into 2D arrays, cells without mass
+# contribute zero flow to the mean
+stack = read_stack(system.datamaps, fields=['Y', 'U'])
+profiles = profile(stack['U'], stack['M'] > args.min_mass, fill=0.)
+height = {'data': stack['Y'][0, :, 0]}
 
 # Combine data into single profile
-combined = {}
-combined['data'] = list(np.array(profile['data']).mean(axis=0))
-combined['count'] = list(np.array(profile['count']).mean(axis=0))
-combined['std'] = list(np.array(profile['data']).std(axis=0))
-combined['error'] = list(np.array(combined['std'])/np.sqrt(len(system.datamaps)))
+combined = combine_profiles(profiles)
+combined['data'] = combined.pop('mean')
 
 # If height inside desired and count is non-zero, add to final profile
-final = {'data': [], 'error': [], 'std': [], 'height': []}
-for i, (h, count) in enumerate(zip(height['data'], combined['count'])):
-    if h >= args.ymin and h <= args.ymax and count > 0:
-        final['height'].append(h)
-        for _type in ['data', 'std', 'error']:
-            final[_type].append(combined[_type][i])
+keep = ((height['data'] >= args.ymin) & (height['data'] <= args.ymax)
+        & (combined['count'] > 0))
+final = {'height': height['data'][keep]}
+for _type in ['data', 'std', 'error']:
+    final[_type] = combined[_type][keep]
 
 # Get some plot options
 colours = get_colours(args.colour, 2)
@@ -146,14 +119,7 @@ plt.plot(final['data'], final['height'], color=colours[0], linestyle=linestyles[
 
 # Calculate and print linear fit if wanted
 if args.fit:
-    fitfunc = lambda p, h, f: f - p[0] - p[1] * h
-    pinit = [1.0, 0.1]
-    out = optimize.leastsq(fitfunc, pinit,
-        args=(np.array(final['height']), np.array(final['data'])), full_output=1)
-
-    pfinal = out[0]
-    A = pfinal[0]
-    B = pfinal[1]
+    A, B = fit_linear(final['height'], final['data'])
 
     print("Linear fit of flow U as a function of height H, U = A + B * H:")
     print("A = %g" % A)
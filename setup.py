@@ -35,6 +35,8 @@ setup(
             'scripts/f_viscous_dissipation.py',
             'scripts/f_interface.py',
             'scripts/f_shearmax.py',
-            'scripts/f_contactline.py'
+            'scripts/f_contactline.py',
+            'scripts/f_pyramid.py',
+            'scripts/f_analyse.py'
             ]
         )